@@ -0,0 +1,213 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from media_cache import cache_dir, cache_path
+
+# Audio for playback. The soundtrack is extracted once per video into the
+# on-disk cache (keyed by path + size + mtime) in the background the first
+# time the video is played; Play, pause and seeks then just start the mixer
+# at the right offset. The cached WAVs are capped at AUDIO_CACHE_MB in total,
+# evicting the least recently played first.
+#
+# pygame is only imported, and the mixer only opened, when audio is first
+# played. Without an audio device playback simply stays silent.
+
+pygame = None
+
+AUDIO_CACHE_MB = 2048  # about three hours of 44.1 kHz stereo
+
+def open_mixer():
+    global pygame
+    if pygame is None:
+        import pygame as module
+        module.mixer.init()
+        pygame = module
+    return pygame.mixer
+
+# Drop the least recently played soundtracks until the cache fits, never keep
+def trim_audio_cache(keep, limit_mb=AUDIO_CACHE_MB):
+    folder = os.path.dirname(keep)
+    entries = []
+    for name in os.listdir(folder):
+        if not name.endswith(".wav"):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        entries.append((st.st_mtime, st.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= limit_mb * 1024 * 1024:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError as e:
+            print(f"Could not evict cached audio: {e}")
+
+def extract_audio(video_path):
+    path = cache_path("audio", video_path, ".wav")
+    if os.path.exists(path):
+        os.utime(path)  # the mtime marks when it was last played
+        return path
+
+    # Each extraction writes its own temporary file, so two editors opening
+    # the same video never write into one
+    fd, partial = tempfile.mkstemp(suffix=".part", dir=cache_dir("audio"))
+    os.close(fd)
+    try:
+        result = subprocess.run([
+            'ffmpeg', '-v', 'error', '-i', video_path, '-vn', '-acodec', 'pcm_s16le',
+            '-ar', '44100', '-ac', '2', '-f', 'wav', '-y', partial
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            return None  # No audio stream, or ffmpeg is missing
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+
+    trim_audio_cache(path)
+    return path
+
+class AudioPlayer:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.video_path = None
+        self.audio_path = None
+        self.loaded_path = None
+        self.ready = False
+        self.extracting = False
+        self.pending = None         # (position, requested_at) waiting for extraction
+        self.start_position = None  # where the current play() started, in seconds
+        self.volume = 1.0
+        self.mixer = None          # pygame.mixer once opened
+        self.mixer_failed = False  # no audio device (or no pygame): stay silent
+        self.chunk_path = os.path.join(tempfile.gettempdir(), f"captionedit-audio-{os.getpid()}.wav")
+
+    # A newly opened video; its soundtrack is extracted on the first play()
+    def prepare(self, video_path):
+        self.stop()
+        with self.lock:
+            self.video_path = video_path
+            self.audio_path = None
+            self.ready = False
+            self.extracting = False
+
+    # Extract (or find the cached) soundtrack in the background
+    def _extract_locked(self):
+        if self.extracting or not self.video_path:
+            return
+        self.extracting = True
+        video_path = self.video_path
+
+        def work():
+            try:
+                path = extract_audio(video_path)
+            except Exception as e:
+                print(f"Audio error: {e}")
+                path = None
+            with self.lock:
+                if self.video_path != video_path:
+                    return
+                self.audio_path = path
+                self.ready = True
+                if self.pending:
+                    self._start_locked()
+
+        threading.Thread(target=work, daemon=True).start()
+
+    def play(self, position):
+        with self.lock:
+            self.pending = (max(0.0, position), time.monotonic())
+            if self.ready:
+                self._start_locked()
+            else:
+                self._extract_locked()
+
+    def seek(self, position):
+        with self.lock:
+            if self.start_position is not None or self.pending:
+                self.play(position)
+
+    def pause(self):
+        with self.lock:
+            self.pending = None
+            self.start_position = None
+            if self.mixer:
+                self.mixer.music.stop()
+
+    def stop(self):
+        self.pause()
+
+    def set_volume(self, volume):
+        self.volume = volume
+        if self.mixer:
+            self.mixer.music.set_volume(volume)
+
+    # Current playback position in seconds, or None when nothing is playing
+    def position(self):
+        with self.lock:
+            if self.start_position is None or not self.mixer or not self.mixer.music.get_busy():
+                return None
+            return self.start_position + self.mixer.music.get_pos() / 1000.0
+
+    def _open_mixer_locked(self):
+        if self.mixer is None and not self.mixer_failed:
+            try:
+                self.mixer = open_mixer()
+            except Exception as e:
+                print(f"Audio disabled: {e}")
+                self.mixer_failed = True
+        return self.mixer
+
+    def _start_locked(self):
+        position, requested_at = self.pending
+        self.pending = None
+        if not self.audio_path or not self._open_mixer_locked():
+            return
+
+        # The video kept going while the soundtrack was being extracted
+        position += time.monotonic() - requested_at
+        try:
+            if self.loaded_path != self.audio_path:
+                self.mixer.music.load(self.audio_path)
+                self.loaded_path = self.audio_path
+            self.mixer.music.set_volume(self.volume)
+            try:
+                self.mixer.music.play(start=position)
+            except pygame.error:
+                # Older SDL_mixer builds cannot seek in WAV files
+                self._play_from_chunk(position)
+            self.start_position = position
+        except Exception as e:
+            print(f"Audio error: {e}")
+            self.start_position = None
+
+    def _play_from_chunk(self, position):
+        self.mixer.music.unload()
+        self.loaded_path = None
+        subprocess.run([
+            'ffmpeg', '-v', 'error', '-ss', f"{position:.3f}", '-i', self.audio_path,
+            '-c', 'copy', '-y', self.chunk_path
+        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.mixer.music.load(self.chunk_path)
+        self.mixer.music.set_volume(self.volume)
+        self.mixer.music.play()
+
+    def close(self):
+        self.stop()
+        if os.path.exists(self.chunk_path):
+            try:
+                if self.mixer:
+                    self.mixer.music.unload()
+                os.remove(self.chunk_path)
+            except Exception:
+                pass
@@ -0,0 +1,129 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from caption_core import load_project
+from export_engine import ENCODERS, EXPORT_MODES, init_export_worker, run_export
+from stage_timer import trace_path_for
+
+# Headless batch export of saved caption projects.
+#
+#   python batch_export.py night/*.json -o renders/ -j 8 --report report.json
+#
+# In the serial and pipelined modes, -j projects render side by side.
+# With --mode segmented, projects render one after another and each one is
+# split across -j worker processes instead.
+#
+# Per-stage timings are printed with each job and included in --report;
+# --trace also writes <output>.trace.json for chrome://tracing or Perfetto.
+#
+# Exit codes (per job and for the whole run, which reports the worst one):
+#   0 = exported, 1 = export failed, 2 = project file could not be read
+
+EXIT_OK = 0
+EXIT_EXPORT_FAILED = 1
+EXIT_BAD_PROJECT = 2
+
+def default_output_path(project_path, output_dir=None):
+    base = os.path.splitext(os.path.basename(project_path))[0]
+    folder = output_dir or os.path.dirname(os.path.abspath(project_path))
+    return os.path.join(folder, f"{base}_captioned.mp4")
+
+def run_job(project_path, output_path, mode="serial", options=None, trace=False):
+    result = {"project": project_path, "output": output_path, "frames": 0, "seconds": 0.0, "fps": 0.0}
+    start = time.perf_counter()
+
+    try:
+        video_path, captions = load_project(project_path)
+    except Exception as e:
+        result.update(exit_code=EXIT_BAD_PROJECT, error=f"Failed to load project: {e}")
+        return result
+
+    try:
+        trace_path = trace_path_for(output_path) if trace else None
+        stats = run_export(video_path, captions, output_path, mode, trace_path=trace_path, **(options or {}))
+        result.update(stats)
+        result["exit_code"] = EXIT_OK
+    except Exception as e:
+        result.update(exit_code=EXIT_EXPORT_FAILED, error=str(e))
+
+    result["wall_seconds"] = time.perf_counter() - start
+    return result
+
+def print_result(result):
+    name = os.path.basename(result["project"])
+    if result["exit_code"] == EXIT_OK:
+        print(f"[ok] {name}: {result['frames']} frames in {result['seconds']:.1f}s "
+              f"({result['fps']:.1f} fps) -> {result['output']}")
+        stages = result.get("stages", {})
+        if stages:
+            print("      " + ", ".join(f"{stage} {s['mean_ms']:.2f} ms (p95 {s['p95_ms']:.2f})"
+                                       for stage, s in stages.items()))
+    else:
+        print(f"[exit {result['exit_code']}] {name}: {result.get('error', 'unknown error')}", file=sys.stderr)
+    sys.stdout.flush()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export saved caption projects without the GUI.")
+    parser.add_argument("projects", nargs="+", help="project files written by Save Project (.cproj, or legacy .json)")
+    parser.add_argument("-o", "--output-dir", help="directory for rendered videos (default: next to each project)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of projects rendered in parallel (default: number of cores)")
+    parser.add_argument("--mode", choices=sorted(EXPORT_MODES), default="serial",
+                        help="export engine to use for each project (default: serial; smart is experimental)")
+    parser.add_argument("--encoder", choices=ENCODERS, default="auto",
+                        help="ffmpeg (piped libx264) or opencv (cv2.VideoWriter); auto uses ffmpeg when installed")
+    parser.add_argument("--preset", default="veryfast", help="x264 preset for the ffmpeg encoder (default: veryfast)")
+    parser.add_argument("--crf", type=int, default=20, help="x264 CRF for the ffmpeg encoder (default: 20)")
+    parser.add_argument("--threads", type=int, default=0, help="ffmpeg encoder threads, 0 = automatic (default: 0)")
+    parser.add_argument("--report", help="write per-job results as JSON to this file")
+    parser.add_argument("--trace", action="store_true", help="write a Chrome trace next to each output")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    jobs = [(path, default_output_path(path, args.output_dir)) for path in args.projects]
+    options = {"encoder": args.encoder, "preset": args.preset, "crf": args.crf, "threads": args.threads}
+    if args.mode == "segmented":
+        # The export itself is split across processes; run the projects one at a time
+        workers = 1
+        options["workers"] = max(1, args.jobs)
+    else:
+        workers = max(1, min(args.jobs, len(jobs)))
+    results = []
+    start = time.perf_counter()
+
+    if workers == 1:
+        for project_path, output_path in jobs:
+            result = run_job(project_path, output_path, args.mode, options, args.trace)
+            print_result(result)
+            results.append(result)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_export_worker) as pool:
+            futures = [pool.submit(run_job, project_path, output_path, args.mode, options, args.trace)
+                       for project_path, output_path in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                print_result(result)
+                results.append(result)
+
+    elapsed = time.perf_counter() - start
+    total_frames = sum(r["frames"] for r in results)
+    failed = sum(1 for r in results if r["exit_code"] != EXIT_OK)
+    print(f"{len(results) - failed}/{len(results)} jobs succeeded, {total_frames} frames in {elapsed:.1f}s "
+          f"({total_frames / elapsed if elapsed > 0 else 0.0:.1f} fps aggregate, {max(workers, args.jobs)} workers)")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"mode": args.mode, "workers": args.jobs, "seconds": elapsed, "jobs": results}, f, indent=4)
+
+    return max((r["exit_code"] for r in results), default=EXIT_OK)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import cv2
+import numpy as np
+from caption_core import Caption, caption_scale, draw_captions, sprite_cache
+from caption_index import CaptionIndex
+from export_engine import EXPORT_MODES, open_writer, run_export
+from media_cache import cache_dir
+from playback import PlaybackDecoder, to_preview
+from video_index import IndexedSeeker, load_or_build_index
+
+# Performance benchmarks for decoding, preview, caption compositing and export.
+#
+#   python benchmark.py -o results.json
+#   python benchmark.py --resolutions 4k --captions 10,20000 --modes serial,pipelined
+#   python benchmark.py --baseline results.json   # exit 1 if anything got slower
+#
+# Test clips and caption sets are synthetic and generated from fixed seeds,
+# so runs on the same machine are comparable. Clips are written once into the
+# cache (or --workdir) and reused.
+#
+# Exit codes: 0 = done (and no regressions), 1 = regression against --baseline
+
+RESOLUTIONS = {
+    "720p": (1280, 720),
+    "1080p": (1920, 1080),
+    "4k": (3840, 2160),
+}
+
+RESULTS_VERSION = 1
+
+# Synthetic media
+
+def synthetic_frame(width, height, frame_num):
+    # Moving gradients plus a little noise, so the encoder and decoder have real work
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = (x + frame_num * 3) % 256
+    frame[..., 1] = (y + frame_num * 2) % 256
+    frame[..., 2] = ((x + y) / 2 + frame_num) % 256
+    noise = np.random.default_rng(frame_num).integers(0, 16, (height // 8, width // 8, 3), dtype=np.uint8)
+    frame += cv2.resize(noise, (width, height), interpolation=cv2.INTER_NEAREST)
+    bar = (frame_num * 8) % width
+    frame[:, bar:bar + width // 40] = 255
+    cv2.putText(frame, f"{frame_num:06d}", (width // 20, height // 5), cv2.FONT_HERSHEY_SIMPLEX,
+                height / 300, (0, 0, 0), max(1, height // 200))
+    return frame
+
+def synthetic_video(workdir, resolution, seconds, fps=30):
+    width, height = RESOLUTIONS[resolution]
+    path = os.path.join(workdir, f"synthetic_{resolution}_{seconds}s_{fps}fps.mp4")
+    if os.path.exists(path):
+        return path
+
+    partial = path + ".part.mp4"
+    out = open_writer(partial, fps, width, height)
+    try:
+        for frame_num in range(int(seconds * fps)):
+            out.write(synthetic_frame(width, height, frame_num))
+    finally:
+        out.release()
+    os.replace(partial, path)
+    return path
+
+# Large sets are spread over a longer timeline than the clip, so about 8
+# captions are on screen at once however many there are (as in a long project)
+def synthetic_captions(count, total_frames, seed=0):
+    rng = random.Random(seed)
+    span = max(total_frames, count * 8)
+    words = ["caption", "subtitle", "benchmark", "overlay", "frame", "render", "preview", "export"]
+    captions = []
+    for i in range(count):
+        start = rng.randrange(span)
+        end = min(span - 1, start + rng.randrange(15, 120))
+        text = " ".join(rng.choice(words) for _ in range(rng.randrange(1, 6)))
+        captions.append(Caption(f"{i}: {text}", rng.randrange(100, 860), rng.randrange(60, 480), start, end,
+                                font_size=rng.choice([18, 24, 32, 48])))
+    return captions
+
+# Measurements
+
+def summarize(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered) * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+def frame_count(video_path, index):
+    if index and index.frame_count:
+        return index.frame_count
+    cap = cv2.VideoCapture(video_path)
+    count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return count
+
+# Random seek + decode, as when jumping with the slider
+def bench_seek(video_path, index, seeks=60, seed=1):
+    total = frame_count(video_path, index)
+    rng = random.Random(seed)
+    targets = [rng.randrange(total) for _ in range(seeks)]
+    cap = cv2.VideoCapture(video_path)
+    seeker = IndexedSeeker(cap, index)
+    samples = []
+    try:
+        for target in targets:
+            began = time.perf_counter()
+            seeker.seek(target)
+            seeker.read()
+            samples.append(time.perf_counter() - began)
+    finally:
+        cap.release()
+    return summarize(samples)
+
+# What show_frame does while scrubbing: short forward steps, preview resize and captions
+def bench_scrub(video_path, index, captions, steps=120, stride=3):
+    total = frame_count(video_path, index)
+    caption_index = CaptionIndex(captions)
+    cap = cv2.VideoCapture(video_path)
+    seeker = IndexedSeeker(cap, index)
+    samples = []
+    try:
+        for step in range(steps):
+            target = (step * stride) % total
+            began = time.perf_counter()
+            seeker.seek(target)
+            ret, frame = seeker.read()
+            if not ret:
+                break
+            preview = to_preview(frame)
+            for caption in caption_index.at(target):
+                sprite = sprite_cache.get(caption)
+                if sprite is not None:
+                    sprite.blend_onto(preview, int(caption.x), int(caption.y))
+            samples.append(time.perf_counter() - began)
+    finally:
+        cap.release()
+    return summarize(samples)
+
+# Sustained playback: how fast the background decoder delivers preview frames
+def bench_playback(video_path, index, max_frames=300):
+    total = min(frame_count(video_path, index), max_frames)
+    decoder = PlaybackDecoder(video_path, index=index)
+    decoder.start(0)
+    shown = 0
+    began = time.perf_counter()
+    try:
+        frame_num = 0
+        while frame_num < total:
+            item = decoder.get(frame_num, timeout=1.0)
+            if item is None:
+                if decoder.exhausted:
+                    break
+                continue
+            shown += 1
+            frame_num = item[0] + 1
+    finally:
+        decoder.stop()
+    elapsed = time.perf_counter() - began
+    return {"frames": shown, "seconds": elapsed, "fps": shown / elapsed if elapsed > 0 else 0.0}
+
+# Caption lookup and compositing on full-resolution frames, excluding decode
+def bench_composite(video_path, captions, frames=60):
+    cap = cv2.VideoCapture(video_path)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    ret, source = cap.read()
+    cap.release()
+    if not ret:
+        return {"count": 0}
+
+    x_scale, y_scale = caption_scale(width, height)
+    caption_index = CaptionIndex(captions)
+    caption_index.rebuild()
+    total = max(c.end_frame for c in captions) + 1 if captions else 1
+    lookup, composite, active = [], [], 0
+    for i in range(frames):
+        frame_num = (i * 37) % total
+        frame = source.copy()
+        began = time.perf_counter()
+        visible = caption_index.at(frame_num)
+        looked_up = time.perf_counter()
+        draw_captions(frame, visible, x_scale, y_scale)
+        lookup.append(looked_up - began)
+        composite.append(time.perf_counter() - looked_up)
+        active += len(visible)
+    return {"lookup": summarize(lookup), "composite": summarize(composite), "mean_active": active / frames}
+
+def bench_export(video_path, captions, mode, workdir, encoder="auto"):
+    output_path = os.path.join(workdir, f"bench_export_{mode}.mp4")
+    try:
+        stats = run_export(video_path, captions, output_path, mode, encoder=encoder)
+    finally:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+    return {key: stats[key] for key in ("frames", "seconds", "fps", "rendered_frames", "stages") if key in stats}
+
+# Results
+
+def machine_info():
+    return {
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+    }
+
+# Lower-is-better and higher-is-better metrics that --baseline compares
+def headline_metrics(result):
+    name = result["benchmark"]
+    if "error" in result:
+        return {}
+    if name in ("seek", "seek_unindexed", "scrub"):
+        return {"p95_ms": (result["p95_ms"], "lower")}
+    if name == "composite":
+        return {"composite_p95_ms": (result["composite"]["p95_ms"], "lower")}
+    if name in ("playback", "export"):
+        return {"fps": (result["fps"], "higher")}
+    return {}
+
+def result_key(result):
+    return (result["benchmark"], result["resolution"], result.get("captions"), result.get("mode"))
+
+def compare(results, baseline, tolerance):
+    previous = {result_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        old = previous.get(result_key(result))
+        if not old:
+            continue
+        old_metrics = headline_metrics(old)
+        for metric, (value, better) in headline_metrics(result).items():
+            if metric not in old_metrics or not old_metrics[metric][0]:
+                continue
+            before = old_metrics[metric][0]
+            change = (value - before) / before
+            if (better == "lower" and change > tolerance) or (better == "higher" and -change > tolerance):
+                regressions.append(f"{'/'.join(str(k) for k in result_key(result) if k is not None)} "
+                                   f"{metric}: {before:.2f} -> {value:.2f} ({change * 100:+.0f}%)")
+    return regressions
+
+def print_result(result):
+    label = " ".join(str(result[k]) for k in ("benchmark", "resolution", "captions", "mode") if result.get(k) is not None)
+    if "error" in result:
+        print(f"{label}: unavailable ({result['error']})")
+    else:
+        metrics = headline_metrics(result)
+        print(f"{label}: " + ", ".join(f"{metric}={value:.2f}" for metric, (value, _) in metrics.items()))
+    sys.stdout.flush()
+
+# Rewritten after every result, so an interrupted run keeps what it measured
+def write_report(path, report):
+    partial = path + ".part"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    os.replace(partial, path)
+
+def parse_list(value):
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark decoding, preview, caption compositing and export.")
+    parser.add_argument("-o", "--output", help="write results as JSON to this file")
+    parser.add_argument("--resolutions", type=parse_list, default=["720p", "1080p"],
+                        help=f"comma-separated, from {', '.join(RESOLUTIONS)} (default: 720p,1080p)")
+    parser.add_argument("--seconds", type=int, default=10, help="length of each synthetic clip (default: 10)")
+    parser.add_argument("--captions", type=lambda v: [int(n) for n in parse_list(v)], default=[10, 1000, 20000],
+                        help="comma-separated caption set sizes (default: 10,1000,20000)")
+    parser.add_argument("--modes", type=parse_list, default=["serial", "pipelined", "segmented"],
+                        help=f"export modes to time, from {', '.join(EXPORT_MODES)}; empty to skip export")
+    parser.add_argument("--encoder", default="auto", help="encoder for the export benchmarks (default: auto)")
+    parser.add_argument("--workdir", help="where synthetic clips are kept (default: the media cache)")
+    parser.add_argument("--baseline", help="earlier results file; exit 1 if a metric regressed")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="allowed slowdown against --baseline, as a fraction (default: 0.15)")
+    args = parser.parse_args(argv)
+
+    for resolution in args.resolutions:
+        if resolution not in RESOLUTIONS:
+            parser.error(f"unknown resolution: {resolution}")
+    for mode in args.modes:
+        if mode not in EXPORT_MODES:
+            parser.error(f"unknown export mode: {mode}")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = args.workdir or cache_dir("benchmark")
+    os.makedirs(workdir, exist_ok=True)
+    results = []
+    report = {"version": RESULTS_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "machine": machine_info(), "seconds": args.seconds, "results": results}
+
+    # A benchmark that cannot run here (e.g. segmented export without ffmpeg)
+    # is recorded with its error instead of ending the run
+    def record(bench, *bench_args, **fields):
+        try:
+            result = dict(fields, **bench(*bench_args))
+        except Exception as e:
+            result = dict(fields, error=str(e))
+        results.append(result)
+        print_result(result)
+        if args.output:
+            write_report(args.output, report)
+
+    for resolution in args.resolutions:
+        print(f"Preparing {resolution} clip...")
+        sys.stdout.flush()
+        video_path = synthetic_video(workdir, resolution, args.seconds)
+        index = load_or_build_index(video_path)
+        total = frame_count(video_path, index)
+
+        record(bench_seek, video_path, index, benchmark="seek", resolution=resolution)
+        record(bench_seek, video_path, None, benchmark="seek_unindexed", resolution=resolution)
+        record(bench_playback, video_path, index, benchmark="playback", resolution=resolution)
+
+        for count in args.captions:
+            captions = synthetic_captions(count, total)
+            sprite_cache.clear()
+            record(bench_scrub, video_path, index, captions, benchmark="scrub", resolution=resolution, captions=count)
+            record(bench_composite, video_path, captions, benchmark="composite", resolution=resolution,
+                   captions=count)
+
+        # Export with the smallest caption set, so the modes are compared on decode/encode
+        captions = synthetic_captions(min(args.captions, default=0), total)
+        for mode in args.modes:
+            record(bench_export, video_path, captions, mode, workdir, args.encoder, benchmark="export",
+                   resolution=resolution, captions=len(captions), mode=mode)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"[regression] {regression}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+import os
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from font_index import system_fonts
+
+# Shared caption model, font lookup and overlay drawing.
+# Kept free of any GUI imports so headless tools can use it.
+
+PREVIEW_WIDTH = 960
+PREVIEW_HEIGHT = 540
+
+# Available font file names (see font_index.py)
+def get_system_fonts():
+    fonts = set(system_fonts.names())
+    # Add default fonts as fallback
+    fonts.update(['arial.ttf', 'DejaVuSans.ttf'])
+    return sorted(fonts)
+
+# Caption class
+# Slotted, since projects can hold tens of thousands of captions
+class Caption:
+    __slots__ = ("text", "x", "y", "start_frame", "end_frame", "font_size", "color", "font_name",
+                 "canvas_id", "selected")
+
+    def __init__(self, text, x, y, start_frame, end_frame, font_size=24, color="white", font_name="arial.ttf"):
+        self.text = text
+        self.x = x
+        self.y = y
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.font_size = font_size
+        self.color = color
+        self.font_name = font_name
+        self.canvas_id = None
+        self.selected = False
+
+    def to_dict(self):
+        return {
+            "text": self.text,
+            "x": self.x,
+            "y": self.y,
+            "start_frame": self.start_frame,
+            "end_frame": self.end_frame,
+            "font_size": self.font_size,
+            "color": self.color,
+            "font_name": self.font_name
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["text"],
+            data["x"],
+            data["y"],
+            data["start_frame"],
+            data["end_frame"],
+            data.get("font_size", 24),
+            data.get("color", "white"),
+            data.get("font_name", "arial.ttf")
+        )
+
+# Font handling
+# Loaded fonts are cached per (font_name, size); the lookup probes the disk and
+# parses the font file, which is far too slow to repeat for every caption on every frame.
+@lru_cache(maxsize=128)
+def get_font(font_name, size):
+    try:
+        font_path = system_fonts.path(font_name)
+        if not font_path:
+            # Fallback to default font
+            return ImageFont.truetype("arial.ttf", size)
+
+        return ImageFont.truetype(font_path, size)
+    except:
+        try:
+            return ImageFont.truetype("DejaVuSans.ttf", size)
+        except:
+            return ImageFont.load_default()
+
+# Project files
+# .cproj projects are gzip-compressed columnar JSON: one list per caption field,
+# with font size/color/font name shared through a style table. .json projects
+# (the original format) still load and save, for use with older versions.
+# Every save stamps a new journal id; edits made since are replayed from the
+# project's autosave journal when the ids match (see project_journal.py).
+PROJECT_EXTENSION = ".cproj"
+PROJECT_FORMAT_VERSION = 1
+
+def project_columns(video_path, captions, journal_id):
+    styles = {}
+    style_column = []
+    for caption in captions:
+        style = (caption.font_size, caption.color, caption.font_name)
+        style_column.append(styles.setdefault(style, len(styles)))
+    return {
+        "format": "captionedit-project",
+        "version": PROJECT_FORMAT_VERSION,
+        "video_path": video_path,
+        "journal_id": journal_id,
+        "styles": [list(style) for style in styles],
+        "text": [caption.text for caption in captions],
+        "x": [caption.x for caption in captions],
+        "y": [caption.y for caption in captions],
+        "start_frame": [caption.start_frame for caption in captions],
+        "end_frame": [caption.end_frame for caption in captions],
+        "style": style_column
+    }
+
+def captions_from_columns(project_data):
+    if project_data.get("version", 0) > PROJECT_FORMAT_VERSION:
+        raise ValueError("Project was saved by a newer version of the editor")
+    styles = project_data["styles"]
+    return [
+        Caption(text, x, y, start, end, *styles[style])
+        for text, x, y, start, end, style in zip(
+            project_data["text"], project_data["x"], project_data["y"],
+            project_data["start_frame"], project_data["end_frame"], project_data["style"])
+    ]
+
+# Returns (video_path, captions, journal), with the autosave journal already
+# replayed; journal continues it (see project_journal.ProjectJournal).
+def read_project(file_path):
+    from project_journal import open_journal
+    with open(file_path, "rb") as f:
+        data = f.read()
+    if data[:2] == b"\x1f\x8b":  # gzip magic
+        project_data = json.loads(gzip.decompress(data))
+        captions = captions_from_columns(project_data)
+    else:
+        project_data = json.loads(data)
+        captions = [Caption.from_dict(caption) for caption in project_data["captions"]]
+    video_path, journal = open_journal(file_path, project_data.get("journal_id"), project_data["video_path"], captions)
+    return video_path, captions, journal
+
+def load_project(file_path):
+    video_path, captions, _ = read_project(file_path)
+    return video_path, captions
+
+# Written atomically; returns the new journal id
+def save_project(file_path, video_path, captions):
+    journal_id = os.urandom(8).hex()
+    if file_path.lower().endswith(".json"):
+        project_data = {
+            "video_path": video_path,
+            "journal_id": journal_id,
+            "captions": [caption.to_dict() for caption in captions]
+        }
+        data = json.dumps(project_data, indent=4).encode("utf-8")
+    else:
+        project_data = project_columns(video_path, captions, journal_id)
+        data = gzip.compress(json.dumps(project_data, separators=(",", ":")).encode("utf-8"), compresslevel=6)
+
+    partial = file_path + ".part"
+    with open(partial, "wb") as f:
+        f.write(data)
+    os.replace(partial, file_path)
+    return journal_id
+
+# Map preview (960x540) caption coordinates onto the output frame size
+def caption_scale(width, height):
+    aspect_ratio = width / height
+    preview_aspect = PREVIEW_WIDTH / PREVIEW_HEIGHT
+    x_scale = width / PREVIEW_WIDTH if aspect_ratio >= preview_aspect else height / PREVIEW_HEIGHT * aspect_ratio
+    y_scale = height / PREVIEW_HEIGHT if aspect_ratio <= preview_aspect else width / PREVIEW_WIDTH / aspect_ratio
+    return x_scale, y_scale
+
+# Caption sprites
+# A caption is rasterized once into an RGBA array and then alpha-blended onto
+# frames with NumPy. The premultiplied color and inverse alpha are kept
+# alongside so blending is a single integer multiply-add per pixel.
+class CaptionSprite:
+    def __init__(self, rgba, offset_x, offset_y):
+        # Trim fully transparent borders so blending only touches pixels the text covers
+        rows = np.flatnonzero(rgba[..., 3].any(axis=1))
+        cols = np.flatnonzero(rgba[..., 3].any(axis=0))
+        if len(rows) and len(cols):
+            rgba = rgba[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+            offset_x += int(cols[0])
+            offset_y += int(rows[0])
+
+        self.rgba = np.ascontiguousarray(rgba)
+        self.offset_x = offset_x
+        self.offset_y = offset_y
+        alpha = self.rgba[..., 3:4].astype(np.uint16)
+        self.premultiplied = self.rgba[..., :3].astype(np.uint16) * alpha
+        # Frames from OpenCV are BGR; keep a contiguous copy in that order too
+        self.premultiplied_bgr = np.ascontiguousarray(self.premultiplied[..., ::-1])
+        self.inverse_alpha = 255 - alpha
+        self.nbytes = (self.rgba.nbytes + self.premultiplied.nbytes + self.premultiplied_bgr.nbytes +
+                       self.inverse_alpha.nbytes)
+
+    # Blend onto an RGB (or BGR) uint8 frame in place, with the text origin at (x, y).
+    # Only the sprite's bounding box of the frame is read or written.
+    def blend_onto(self, frame, x, y, bgr=False):
+        height, width = self.rgba.shape[:2]
+        frame_height, frame_width = frame.shape[:2]
+        left = x + self.offset_x
+        top = y + self.offset_y
+        x0, y0 = max(left, 0), max(top, 0)
+        x1, y1 = min(left + width, frame_width), min(top + height, frame_height)
+        if x0 >= x1 or y0 >= y1:
+            return
+
+        source = self.premultiplied_bgr if bgr else self.premultiplied
+        premultiplied = source[y0 - top:y1 - top, x0 - left:x1 - left]
+        inverse_alpha = self.inverse_alpha[y0 - top:y1 - top, x0 - left:x1 - left]
+        roi = frame[y0:y1, x0:x1]
+
+        # roi * (255 - a) + color * a, rounded; one ROI-sized temporary
+        blended = roi * inverse_alpha
+        blended += premultiplied
+        blended += 127
+        blended //= 255
+        roi[...] = blended
+
+def _text_mask(size, origins, text, font):
+    mask = Image.new("L", size, 0)
+    draw = ImageDraw.Draw(mask)
+    for origin in origins:
+        draw.text(origin, text, font=font, fill=255)
+    return np.asarray(mask, dtype=np.float32)[..., None] / 255.0
+
+def render_caption_sprite(text, font_name, font_size, color, outline_color=None):
+    font = get_font(font_name, font_size)
+    pad = 1 if outline_color else 0
+    left, top, right, bottom = ImageDraw.Draw(Image.new("L", (1, 1))).textbbox((0, 0), text, font=font)
+    if right <= left or bottom <= top:
+        return None
+
+    size = (right - left + 2 * pad, bottom - top + 2 * pad)
+    ox, oy = pad - left, pad - top
+    text_alpha = _text_mask(size, [(ox, oy)], text, font)
+    text_color = np.array(ImageColor.getrgb(color)[:3], dtype=np.float32)
+
+    if outline_color:
+        # Same one-pixel diagonal outline the preview used to draw with four draw.text calls
+        outline_alpha = _text_mask(size, [(ox - 1, oy - 1), (ox + 1, oy - 1), (ox - 1, oy + 1), (ox + 1, oy + 1)], text, font)
+        outline_rgb = np.array(ImageColor.getrgb(outline_color)[:3], dtype=np.float32)
+        alpha = text_alpha + outline_alpha * (1.0 - text_alpha)
+        rgb = (text_color * text_alpha + outline_rgb * outline_alpha * (1.0 - text_alpha)) / np.maximum(alpha, 1e-6)
+    else:
+        alpha = text_alpha
+        rgb = np.broadcast_to(text_color, text_alpha.shape[:2] + (3,))
+
+    rgba = np.empty((size[1], size[0], 4), dtype=np.uint8)
+    rgba[..., :3] = np.clip(rgb + 0.5, 0, 255)
+    rgba[..., 3:] = np.clip(alpha * 255.0 + 0.5, 0, 255)
+    return CaptionSprite(rgba, left - pad, top - pad)
+
+# Bounded LRU of rendered sprites keyed by text/font/size/color (and outline).
+# Shared by the preview and the export thread, hence the lock.
+class SpriteCache:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.sprites = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key_for(caption, outline_color=None):
+        return (caption.text, caption.font_name, caption.font_size, caption.color, outline_color)
+
+    def get(self, caption, outline_color=None):
+        key = self.key_for(caption, outline_color)
+        with self.lock:
+            if key in self.sprites:
+                self.sprites.move_to_end(key)
+                return self.sprites[key]
+
+            sprite = render_caption_sprite(*key)
+            self.sprites[key] = sprite
+            if sprite is not None:
+                self.current_bytes += sprite.nbytes
+            while self.current_bytes > self.max_bytes and len(self.sprites) > 1:
+                _, evicted = self.sprites.popitem(last=False)
+                if evicted is not None:
+                    self.current_bytes -= evicted.nbytes
+            return sprite
+
+    # Drop every variant of this caption's current appearance
+    def invalidate(self, caption):
+        with self.lock:
+            for key in [k for k in self.sprites if k[:4] == self.key_for(caption)[:4]]:
+                sprite = self.sprites.pop(key)
+                if sprite is not None:
+                    self.current_bytes -= sprite.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.sprites.clear()
+            self.current_bytes = 0
+
+sprite_cache = SpriteCache()
+
+# Burn the given (already active) captions into a BGR frame, in place.
+# Frames without captions come back untouched, with no copy made.
+def draw_captions(frame, active_captions, x_scale=1.0, y_scale=1.0):
+    for caption in active_captions:
+        sprite = sprite_cache.get(caption)
+        if sprite is not None:
+            sprite.blend_onto(frame, int(caption.x * x_scale), int(caption.y * y_scale), bgr=True)
+
+    return frame
@@ -0,0 +1,204 @@
+import bisect
+import heapq
+
+# Indexes over caption start/end frames so a frame only touches the captions
+# visible on it. Results keep the order of the caption list, because later
+# captions are drawn on top of earlier ones.
+
+class _Node:
+    __slots__ = ("center", "by_start", "by_end", "left", "right")
+
+    def __init__(self, center, by_start, by_end, left, right):
+        self.center = center
+        self.by_start = by_start
+        self.by_end = by_end
+        self.left = left
+        self.right = right
+
+def _split(items, center):
+    left, right, overlapping = [], [], []
+    for item in items:
+        if item[1] < center:
+            left.append(item)
+        elif item[0] > center:
+            right.append(item)
+        else:
+            overlapping.append(item)
+    return left, right, overlapping
+
+def _build(by_start, by_end):
+    # Both lists hold the same (start, end, order, caption) tuples, sorted once
+    # by start and by end (descending); splitting keeps each part sorted, so
+    # no node sorts anything.
+    if not by_start:
+        return None
+
+    # At most half the intervals start after the median start, or end before it
+    center = by_start[len(by_start) // 2][0]
+    left_start, right_start, node_start = _split(by_start, center)
+    left_end, right_end, node_end = _split(by_end, center)
+    return _Node(center, node_start, node_end,
+                 _build(left_start, left_end), _build(right_start, right_end))
+
+def _insert_sorted(items, item, key):
+    i = len(items)
+    while i > 0 and key(items[i - 1]) > key(item):
+        i -= 1
+    items.insert(i, item)
+
+# Centered interval tree for random access (seeks, scrubbing, preview).
+# Moving or appending one caption updates the tree in place; other edits
+# (deletes, imports, undo) mark it dirty and it is rebuilt on the next query.
+class CaptionIndex:
+    def __init__(self, captions=None):
+        self.captions = captions if captions is not None else []
+        self.root = None
+        self.dirty = True
+
+    def set_captions(self, captions):
+        self.captions = captions
+        self.dirty = True
+
+    def invalidate(self):
+        self.dirty = True
+
+    def rebuild(self):
+        items = [(c.start_frame, c.end_frame, order, c) for order, c in enumerate(self.captions)
+                 if c.start_frame <= c.end_frame]
+        by_start = sorted(items, key=lambda item: item[0])
+        by_end = sorted(items, key=lambda item: -item[1])
+        self.root = _build(by_start, by_end)
+        self.dirty = False
+
+    # The caption just appended to the caption list
+    def add(self, caption):
+        if not self.dirty:
+            self._insert((caption.start_frame, caption.end_frame, len(self.captions) - 1, caption))
+
+    # A caption whose start/end frames changed from old_start/old_end
+    def move(self, caption, old_start, old_end):
+        if self.dirty:
+            return
+        order = self._remove(caption, old_start, old_end)
+        if order is None:
+            order = self.captions.index(caption)
+        self._insert((caption.start_frame, caption.end_frame, order, caption))
+
+    def _remove(self, caption, start, end):
+        node = self.root
+        while node is not None:
+            if end < node.center:
+                node = node.left
+            elif start > node.center:
+                node = node.right
+            else:
+                order = None
+                for items in (node.by_start, node.by_end):
+                    for i, item in enumerate(items):
+                        if item[3] is caption:
+                            order = item[2]
+                            del items[i]
+                            break
+                return order
+        return None
+
+    def _insert(self, item):
+        start, end = item[0], item[1]
+        if start > end:
+            return
+        parent, node = None, self.root
+        while node is not None:
+            if end < node.center:
+                parent, node = node, node.left
+            elif start > node.center:
+                parent, node = node, node.right
+            else:
+                _insert_sorted(node.by_start, item, lambda item: item[0])
+                _insert_sorted(node.by_end, item, lambda item: -item[1])
+                return
+
+        leaf = _Node(start, [item], [item], None, None)
+        if parent is None:
+            self.root = leaf
+        elif end < parent.center:
+            parent.left = leaf
+        else:
+            parent.right = leaf
+
+    def at(self, frame):
+        if self.dirty:
+            self.rebuild()
+
+        found = []
+        node = self.root
+        while node is not None:
+            if frame < node.center:
+                for item in node.by_start:
+                    if item[0] > frame:
+                        break
+                    found.append(item)
+                node = node.left
+            elif frame > node.center:
+                for item in node.by_end:
+                    if item[1] < frame:
+                        break
+                    found.append(item)
+                node = node.right
+            else:
+                found.extend(node.by_start)
+                break
+
+        found.sort(key=lambda item: item[2])
+        return [item[3] for item in found]
+
+# Sorted event sweep for sequential passes (export). Advancing frame by frame
+# costs O(log n) per caption entering or leaving; jumping backwards restarts.
+class ActiveCaptionSweep:
+    def __init__(self, captions):
+        self.events = sorted(
+            ((c.start_frame, order, c) for order, c in enumerate(captions)),
+            key=lambda event: event[0]
+        )
+        self.starts = [event[0] for event in self.events]
+        self.reset(0)
+
+    def reset(self, frame):
+        self.position = bisect.bisect_left(self.starts, frame)
+        self.active = {}
+        self.ends = []
+        self.current = []
+        self.frame = frame
+        # Captions that started before the jump point but are still running
+        for start, order, caption in self.events[:self.position]:
+            if caption.end_frame >= frame:
+                self._add(order, caption)
+        self._refresh()
+
+    def _add(self, order, caption):
+        self.active[order] = caption
+        heapq.heappush(self.ends, (caption.end_frame, order))
+
+    def _refresh(self):
+        self.current = [self.active[order] for order in sorted(self.active)]
+
+    def advance(self, frame):
+        if frame < self.frame:
+            self.reset(frame)
+        self.frame = frame
+
+        changed = False
+        while self.position < len(self.events) and self.events[self.position][0] <= frame:
+            start, order, caption = self.events[self.position]
+            self.position += 1
+            if caption.end_frame >= frame:
+                self._add(order, caption)
+                changed = True
+
+        while self.ends and self.ends[0][0] < frame:
+            _, order = heapq.heappop(self.ends)
+            del self.active[order]
+            changed = True
+
+        if changed:
+            self._refresh()
+        return self.current
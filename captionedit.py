@@ -1,27 +1,27 @@
+import time
+startup_began = time.perf_counter()
+
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox, Scale
-import cv2
-from PIL import Image, ImageTk, ImageDraw, ImageFont
 import os
-import json
+import sys
 from datetime import timedelta
-import numpy as np
 import threading
-import platform
 import subprocess
-import pygame  # Added for audio playback
-
-# Initialize pygame for audio
-pygame.mixer.init()
+from audio import AudioPlayer
+from font_index import system_fonts
+from caption_index import CaptionIndex
+from virtual_list import VirtualList
+from stage_timer import StageTimer, format_summary, trace_path_for
 
-# App setup
-ctk.set_appearance_mode("dark")
-ctk.set_default_color_theme("blue")
+# OpenCV, NumPy, PIL and pygame (and the modules built on them: caption_core,
+# playback, video_index, export_engine) are imported inside the functions that
+# need them, so the window appears without waiting for them. The audio mixer
+# is opened on first Play, and the font index loads once the window is up.
 
-app = ctk.CTk()
-app.geometry("1400x900")
-app.title("Caption tool")
+# Same names as export_engine.EXPORT_MODES, which would pull in OpenCV at startup
+EXPORT_MODE_NAMES = ["serial", "segmented", "pipelined", "smart"]
 
 # Global variables
 video_path = None
@@ -31,198 +31,82 @@ video_fps = 0
 current_frame = 0
 is_playing = False
 captions = []
-caption_buttons = []
+caption_index = CaptionIndex(captions)
+transcript_lines = []  # Lines from "Upload Captions", shown in the transcript panel
+project_path = None  # None until saved or loaded; untitled sessions autosave under the cache dir
+journal = None  # Autosave journal of the current project (see project_journal.py)
 selected_caption = None
 playback_speed = 1.0
-available_fonts = []
+available_fonts = ["arial.ttf", "DejaVuSans.ttf"]  # Filled in once the font index has loaded
 volume_level = 1.0  # Default volume (max)
-audio_thread = None
-stop_audio = False
-
-# Get available fonts
-def get_system_fonts():
-    fonts = []
-    try:
-        if platform.system() == "Windows":
-            # Windows font directory
-            font_dir = os.path.join(os.environ['WINDIR'], 'Fonts')
-            for font_file in os.listdir(font_dir):
-                if font_file.endswith(('.ttf', '.ttc', '.otf')):
-                    fonts.append(font_file)
-        elif platform.system() == "Darwin":  # macOS
-            font_dirs = [
-                '/Library/Fonts',
-                '/System/Library/Fonts',
-                os.path.expanduser('~/Library/Fonts')
-            ]
-            for font_dir in font_dirs:
-                if os.path.exists(font_dir):
-                    for font_file in os.listdir(font_dir):
-                        if font_file.endswith(('.ttf', '.ttc', '.otf')):
-                            fonts.append(font_file)
-        else:  # Linux
-            font_dirs = [
-                '/usr/share/fonts',
-                '/usr/local/share/fonts',
-                os.path.expanduser('~/.fonts')
-            ]
-            for font_dir in font_dirs:
-                if os.path.exists(font_dir):
-                    for root, dirs, files in os.walk(font_dir):
-                        for font_file in files:
-                            if font_file.endswith(('.ttf', '.ttc', '.otf')):
-                                fonts.append(font_file)
-    except Exception as e:
-        print(f"Error loading fonts: {e}")
-    
-    # Add default fonts as fallback
-    fonts.extend(['arial.ttf', 'DejaVuSans.ttf'])
-    return sorted(list(set(fonts)))
-
-# Initialize available fonts
-available_fonts = get_system_fonts()
-
-# Caption class
-class Caption:
-    def __init__(self, text, x, y, start_frame, end_frame, font_size=24, color="white", font_name="arial.ttf"):
-        self.text = text
-        self.x = x
-        self.y = y
-        self.start_frame = start_frame
-        self.end_frame = end_frame
-        self.font_size = font_size
-        self.color = color
-        self.font_name = font_name
-        self.canvas_id = None
-        self.selected = False
-    
-    def to_dict(self):
-        return {
-            "text": self.text,
-            "x": self.x,
-            "y": self.y,
-            "start_frame": self.start_frame,
-            "end_frame": self.end_frame,
-            "font_size": self.font_size,
-            "color": self.color,
-            "font_name": self.font_name
-        }
-    
-    @classmethod
-    def from_dict(cls, data):
-        return cls(
-            data["text"],
-            data["x"],
-            data["y"],
-            data["start_frame"],
-            data["end_frame"],
-            data.get("font_size", 24),
-            data.get("color", "white"),
-            data.get("font_name", "arial.ttf")
-        )
-
-# Font handling
-def get_font(font_name, size):
-    try:
-        if platform.system() == "Windows":
-            font_path = os.path.join(os.environ['WINDIR'], 'Fonts', font_name)
-        else:
-            # Try to find the font in common directories
-            font_path = None
-            font_dirs = [
-                '/Library/Fonts',
-                '/System/Library/Fonts',
-                os.path.expanduser('~/Library/Fonts'),
-                '/usr/share/fonts',
-                '/usr/local/share/fonts',
-                os.path.expanduser('~/.fonts')
-            ]
-            
-            for font_dir in font_dirs:
-                if os.path.exists(font_dir):
-                    potential_path = os.path.join(font_dir, font_name)
-                    if os.path.exists(potential_path):
-                        font_path = potential_path
-                        break
-            
-            if not font_path:
-                # Fallback to default font
-                return ImageFont.truetype("arial.ttf", size) if "arial.ttf" in available_fonts else ImageFont.load_default()
-        
-        return ImageFont.truetype(font_path, size)
-    except:
-        try:
-            return ImageFont.truetype("DejaVuSans.ttf", size)
-        except:
-            return ImageFont.load_default()
-
-# Mouse wheel scrolling
-def on_mousewheel(event, canvas):
-    delta = event.delta
-    if platform.system() == "Linux":
-        if event.num == 4:
-            delta = 120
-        elif event.num == 5:
-            delta = -120
-    canvas.yview_scroll(int(-1 * (delta / 120)), "units")
-
-def bind_mousewheel(widget, canvas):
-    widget.bind("<MouseWheel>", lambda e: on_mousewheel(e, canvas))
-    if platform.system() == "Linux":
-        widget.bind("<Button-4>", lambda e: on_mousewheel(e, canvas))
-        widget.bind("<Button-5>", lambda e: on_mousewheel(e, canvas))
-
-# Audio functions
-def play_audio():
-    global stop_audio, volume_level
+audio_player = AudioPlayer()
+playback_decoder = None
+playback_clock = None
+export_mode = "serial"
+export_trace = False  # also write <output>.trace.json when exporting
+use_render_queue = False  # submit exports to render_server.py instead of rendering here
+export_process = None  # export_worker.py running a segmented export, if any
+preview_timer = StageTimer()  # show_frame/render_preview stages; printed on exit with --preview-stats
+preview_cache_mb = 256  # Memory budget for decoded preview frames
+frame_cache = None  # created with the first video
+preview_base = None  # (frame index, 960x540 RGB frame without captions) of the frame on screen
+# Reused for every displayed frame: the captioned frame, the PIL image and
+# Tk photo it is copied through, and the one canvas item showing it
+composite_buffer = None
+preview_image = None
+preview_photo = None
+caption_boxes = []  # (caption, left, top, right, bottom) as drawn on screen, for hit-testing
+prefetcher = None
+video_index = None
+seeker = None
+use_proxy = False  # Preview from a 960x540 proxy of the video (see proxy.py)
+proxy_path = None  # Set once the proxy of video_path is ready
+proxy_index = None
+proxy_cap = None
+filmstrip_frames = {}  # thumbnail slot -> frame it shows
+filmstrip_photos = {}  # thumbnail slot -> PhotoImage (kept alive for the canvas)
+FILMSTRIP_WIDTH = 1000
+
+# Fonts are indexed in the background so the window shows immediately
+def load_fonts():
+    def loaded():
+        from caption_core import get_system_fonts
+        fonts = get_system_fonts()
+        app.after(0, lambda: apply_fonts(fonts))
     
-    if not video_path:
-        return
-        
-    # Extract audio from video using ffmpeg
-    temp_audio = "temp_audio.wav"
-    try:
-        subprocess.run([
-            'ffmpeg', '-i', video_path, '-vn', '-acodec', 'pcm_s16le', 
-            '-ar', '44100', '-ac', '2', '-y', temp_audio
-        ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        
-        # Load and play audio with pygame
-        pygame.mixer.music.load(temp_audio)
-        pygame.mixer.music.set_volume(volume_level)
-        pygame.mixer.music.play()
-        
-        # Keep the thread alive while audio is playing
-        while pygame.mixer.music.get_busy() and not stop_audio:
-            pygame.time.wait(100)
-            
-    except Exception as e:
-        print(f"Audio error: {e}")
-    finally:
-        # Clean up temporary file
-        if os.path.exists(temp_audio):
-            os.remove(temp_audio)
+    system_fonts.load_async(loaded)
 
-def stop_audio_playback():
-    global stop_audio
-    stop_audio = True
-    pygame.mixer.music.stop()
+def apply_fonts(fonts):
+    global available_fonts
+    available_fonts = fonts
+    font_dropdown.configure(values=available_fonts)
 
+# Audio functions
 def set_volume(vol):
     global volume_level
     volume_level = float(vol) / 100.0
     volume_label.configure(text=f"Volume: {int(volume_level * 100)}%")
-    pygame.mixer.music.set_volume(volume_level)
+    audio_player.set_volume(volume_level)
+
+# Audio starts where the video is, not at 0
+def play_audio_at(frame_index):
+    if video_fps > 0:
+        audio_player.play(frame_index / video_fps)
+
+def seek_audio(frame_index):
+    if is_playing and video_fps > 0:
+        audio_player.seek(frame_index / video_fps)
 
 # Video functions
 def upload_video():
-    global video_path, cap, total_frames, video_fps, current_frame, is_playing, stop_audio
+    global video_path, cap, total_frames, video_fps, current_frame, is_playing
+    import cv2
     
     if is_playing:
         toggle_playback()
     
     # Stop any audio playback
-    stop_audio_playback()
+    audio_player.stop()
     
     file_path = filedialog.askopenfilename(
         filetypes=[("Video files", "*.mp4 *.avi *.mov *.mkv *.wmv")]
@@ -234,14 +118,20 @@ def upload_video():
     if cap:
         cap.release()
     
+    close_preview_cache()
+    close_proxy()
+    clear_filmstrip()
     cap = cv2.VideoCapture(video_path)
     
     if not cap.isOpened():
         messagebox.showerror("Error", "Failed to load video. Ensure the file format is supported or install required codecs.")
         return
     
+    open_video_index()
+    audio_player.prepare(video_path)
+    
     total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-    video_fps = int(cap.get(cv2.CAP_PROP_FPS))
+    video_fps = cap.get(cv2.CAP_PROP_FPS)
     duration = total_frames / video_fps
     time_label.configure(text=f"Duration: {timedelta(seconds=int(duration))}")
     
@@ -249,53 +139,293 @@ def upload_video():
     current_frame = 0
     timeline_slider.set(0)
     
+    open_preview_cache()
+    open_proxy()
     show_frame(0)
     update_timeline_display()
+    record_edit("video", path=video_path)
 
 def show_frame(frame_index):
-    global cap, current_frame
+    global cap, current_frame, preview_base
+    from playback import to_preview
     
-    if cap is None:
+    # Also covers a video that failed to open, which leaves no preview cache
+    if cap is None or prefetcher is None:
         return
     
     frame_index = max(0, min(frame_index, total_frames-1))
+    direction = 1 if frame_index >= current_frame else -1
     current_frame = frame_index
     
-    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
-    ret, frame = cap.read()
+    # Redrawing the frame on screen (caption edits, selection) skips decoding
+    if preview_base is not None and preview_base[0] == frame_index:
+        render_preview(preview_base[1], shared=True)
+        return
+    
+    preview = frame_cache.get(frame_index)
+    if preview is None:
+        t = time.perf_counter()
+        seeker.seek(frame_index)
+        ret, frame = seeker.read()
+        t = preview_timer.add("decode", t)
+        
+        if not ret:
+            return
+        
+        preview = to_preview(frame)
+        preview_timer.add("resize", t)
+        frame_cache.put(frame_index, preview)
+    preview_base = (frame_index, preview)
+    
+    prefetcher.request(frame_index, direction)
+    
+    # Cached frames are shared, so render_preview draws captions on a copy
+    render_preview(preview, shared=True)
+
+# Preview frame cache and prefetch (see playback.py)
+def open_preview_cache():
+    global prefetcher, frame_cache
+    from playback import FrameCache, Prefetcher
+    close_preview_cache()
+    if frame_cache is None:
+        frame_cache = FrameCache(preview_cache_mb)
+    path, index = preview_source()
+    prefetcher = Prefetcher(path, frame_cache, total_frames, index=index)
+
+# Keyframe/timestamp index (see video_index.py). Building it can take a few
+# seconds the first time, so it runs in the background; seeks use plain
+# frame seeks until it is ready.
+def open_video_index():
+    global video_index, seeker
+    from video_index import IndexedSeeker, load_or_build_index
+    video_index = None
+    seeker = IndexedSeeker(cap)
+    path = video_path
+    
+    def build():
+        try:
+            index = load_or_build_index(path)
+        except Exception as e:
+            print(f"Video index error: {e}")
+            app.after(0, lambda: open_filmstrip(path, None))
+            return
+        app.after(0, lambda: apply_video_index(path, index))
+    
+    threading.Thread(target=build, daemon=True).start()
+
+def apply_video_index(path, index):
+    global video_index, total_frames
+    if path != video_path:
+        return
+    video_index = index
+    if not proxy_path:
+        seeker.index = index
+        if prefetcher:
+            prefetcher.index = index
+        if playback_decoder:
+            playback_decoder.index = index
+    # The container's frame count is only an estimate
+    if index.frame_count > 0:
+        total_frames = index.frame_count
+        if prefetcher:
+            prefetcher.total_frames = total_frames
+        update_timeline_display()
+    # Started once the index is known, so thumbnails can come from keyframes
+    open_filmstrip(path, index)
+
+# Preview proxy (see proxy.py). It is built in the background; once ready,
+# preview, scrubbing and playback read it instead of the source. Export and
+# clip download always read video_path.
+def open_proxy():
+    import cv2
+    from proxy import build_proxy, needs_proxy
+    if not use_proxy or not cap:
+        return
+    if not needs_proxy(cap.get(cv2.CAP_PROP_FRAME_WIDTH), cap.get(cv2.CAP_PROP_FRAME_HEIGHT)):
+        return
+    path = video_path
+    
+    def build():
+        try:
+            built = build_proxy(path)
+        except Exception as e:
+            print(f"Proxy error: {e}")
+            return
+        if built:
+            app.after(0, lambda: apply_proxy(path, *built))
     
-    if not ret:
+    threading.Thread(target=build, daemon=True).start()
+
+def apply_proxy(path, built_path, index):
+    global proxy_path, proxy_index, proxy_cap, seeker
+    import cv2
+    from video_index import IndexedSeeker
+    if path != video_path or not use_proxy or proxy_path:
+        return
+    capture = cv2.VideoCapture(built_path)
+    if not capture.isOpened():
+        print(f"Proxy error: could not open {built_path}")
+        return
+    proxy_path, proxy_index, proxy_cap = built_path, index, capture
+    seeker = IndexedSeeker(proxy_cap, index)
+    switch_preview_source()
+
+def close_proxy():
+    global proxy_path, proxy_index, proxy_cap
+    proxy_path = None
+    proxy_index = None
+    if proxy_cap:
+        proxy_cap.release()
+        proxy_cap = None
+
+# The file (and its index) that preview frames are decoded from
+def preview_source():
+    if proxy_path:
+        return proxy_path, proxy_index
+    return video_path, video_index
+
+# Restart the preview readers after switching between proxy and source
+def switch_preview_source():
+    open_preview_cache()
+    if playback_decoder:
+        start_playback_decoder()
+    show_frame(current_frame)
+
+def set_use_proxy():
+    global use_proxy, seeker
+    from video_index import IndexedSeeker
+    use_proxy = bool(proxy_check.get())
+    if use_proxy:
+        open_proxy()
+    elif proxy_path:
+        close_proxy()
+        seeker = IndexedSeeker(cap, video_index)
+        switch_preview_source()
+
+# Thumbnail filmstrip above the timeline (see thumbnails.py), filled in by a
+# background thread as thumbnails are decoded, or straight from the disk cache
+def open_filmstrip(path, index):
+    from thumbnails import THUMB_WIDTH, build_thumbnails
+    if path != video_path or total_frames <= 0:
         return
+    clear_filmstrip()
+    count = FILMSTRIP_WIDTH // THUMB_WIDTH
+    frame_count = total_frames
     
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    img = Image.fromarray(frame)
-    img = img.resize((960, 540), Image.Resampling.LANCZOS)
+    def on_thumb(slot, frame_index, thumb):
+        app.after(0, lambda: draw_thumbnail(path, slot, frame_index, thumb))
     
-    draw = ImageDraw.Draw(img)
+    def build():
+        try:
+            build_thumbnails(path, frame_count, count, index, on_thumb, cancelled=lambda: path != video_path)
+        except Exception as e:
+            print(f"Thumbnail error: {e}")
     
-    for caption in captions:
-        if caption.start_frame <= current_frame <= caption.end_frame:
-            font = get_font(caption.font_name, caption.font_size)
-            outline_color = "yellow" if caption.selected else None
-            if outline_color:
-                draw.text((caption.x-1, caption.y-1), caption.text, font=font, fill=outline_color)
-                draw.text((caption.x+1, caption.y-1), caption.text, font=font, fill=outline_color)
-                draw.text((caption.x-1, caption.y+1), caption.text, font=font, fill=outline_color)
-                draw.text((caption.x+1, caption.y+1), caption.text, font=font, fill=outline_color)
-            
-            draw.text((caption.x, caption.y), caption.text, font=font, fill=caption.color)
+    threading.Thread(target=build, daemon=True).start()
+
+def draw_thumbnail(path, slot, frame_index, thumb):
+    from PIL import Image, ImageTk
+    from thumbnails import THUMB_WIDTH
+    if path != video_path:
+        return
+    photo = ImageTk.PhotoImage(Image.fromarray(thumb))
+    filmstrip_photos[slot] = photo
+    filmstrip_frames[slot] = frame_index
+    slot_width = FILMSTRIP_WIDTH // (FILMSTRIP_WIDTH // THUMB_WIDTH)
+    filmstrip_canvas.create_image(slot * slot_width, 0, anchor="nw", image=photo, tags="thumb")
+    filmstrip_canvas.tag_raise(filmstrip_playhead)
+
+def clear_filmstrip():
+    filmstrip_canvas.delete("thumb")
+    filmstrip_photos.clear()
+    filmstrip_frames.clear()
+
+# Jump straight to the frame a thumbnail was taken from
+def on_filmstrip_click(event):
+    from thumbnails import THUMB_WIDTH
+    slot = event.x * (FILMSTRIP_WIDTH // THUMB_WIDTH) // FILMSTRIP_WIDTH
+    frame_index = filmstrip_frames.get(slot)
+    if frame_index is None:
+        return
+    show_frame(frame_index)
+    timeline_slider.set(current_frame * 1000 / total_frames)
+    seek_playback(current_frame)
+    seek_audio(current_frame)
+
+def close_preview_cache():
+    global prefetcher, preview_base
+    preview_base = None
+    if prefetcher:
+        prefetcher.stop()
+        prefetcher = None
+    if frame_cache:
+        frame_cache.clear()
+
+# Draw captions onto a 960x540 RGB frame. A shared frame is only copied
+# (into out, if given) when there is a caption to draw on it. Also returns
+# each caption's box as drawn.
+def composite_captions(preview, active, shared=False, out=None):
+    from caption_core import sprite_cache
+    if active and shared:
+        if out is not None and out.shape == preview.shape:
+            out[...] = preview
+            preview = out
+        else:
+            preview = preview.copy()
+    
+    boxes = []
+    for caption in active:
+        outline_color = "yellow" if caption.selected else None
+        sprite = sprite_cache.get(caption, outline_color)
+        if sprite is not None:
+            x, y = int(caption.x), int(caption.y)
+            sprite.blend_onto(preview, x, y)
+            left, top = x + sprite.offset_x, y + sprite.offset_y
+            height, width = sprite.rgba.shape[:2]
+            boxes.append((caption, left, top, left + width, top + height))
+    return preview, boxes
+
+def display_buffer(preview):
+    global composite_buffer
+    if composite_buffer is None or composite_buffer.shape != preview.shape:
+        composite_buffer = preview.copy()
+    return composite_buffer
+
+# Copy a frame into the photo on the canvas; no new image or canvas item per frame
+def display_preview(preview):
+    global preview_image, preview_photo
+    from PIL import Image, ImageTk
+    height, width = preview.shape[:2]
+    if preview_image is None or preview_image.size != (width, height):
+        preview_image = Image.new("RGB", (width, height))
+        preview_photo = ImageTk.PhotoImage(preview_image)
+        preview_canvas.itemconfigure(preview_item, image=preview_photo)
     
-    imgtk = ImageTk.PhotoImage(img)
+    preview_image.frombytes(preview.data if preview.flags.c_contiguous else preview.tobytes())
+    preview_photo.paste(preview_image)
+
+# Draw the active captions onto a 960x540 RGB frame and show it
+def render_preview(preview, shared=False):
+    global caption_boxes
+    t = time.perf_counter()
+    preview, caption_boxes = composite_captions(preview, caption_index.at(current_frame), shared,
+                                                out=display_buffer(preview))
+    t = preview_timer.add("composite", t)
     
-    preview_canvas.imgtk = imgtk
-    preview_canvas.create_image(0, 0, anchor="nw", image=imgtk)
+    display_preview(preview)
+    preview_timer.add("display", t)
     update_timeline_display()
 
 def on_slider_change(value):
     frame_index = int(float(value) * total_frames / 1000)
     show_frame(frame_index)
+    seek_playback(current_frame)
+    seek_audio(current_frame)
 
 def update_timeline_display():
+    if total_frames > 0:
+        x = current_frame * FILMSTRIP_WIDTH / total_frames
+        filmstrip_canvas.coords(filmstrip_playhead, x, 0, x, filmstrip_canvas.winfo_reqheight())
     if video_fps > 0:
         current_time = current_frame / video_fps
         total_time = total_frames / video_fps
@@ -303,121 +433,193 @@ def update_timeline_display():
         time_label.configure(text=time_display)
 
 def toggle_playback():
-    global is_playing, audio_thread, stop_audio
+    global is_playing, playback_clock
+    from playback import PlaybackClock
     
     is_playing = not is_playing
     play_button.configure(text="Pause" if is_playing else "Play")
     
     if is_playing:
-        # Start audio playback in a separate thread
-        stop_audio = False
-        audio_thread = threading.Thread(target=play_audio, daemon=True)
-        audio_thread.start()
+        # pygame cannot time-stretch, so the soundtrack only plays at 1x
+        if playback_speed == 1.0:
+            play_audio_at(current_frame)
+        playback_clock = PlaybackClock(video_fps, audio_player.position)
+        playback_clock.start(current_frame, playback_speed)
+        start_playback_decoder()
         play_video()
     else:
-        # Stop audio playback
-        stop_audio_playback()
+        audio_player.pause()
+        stop_playback_decoder()
+
+# Sequential decoding for playback (see playback.py)
+def start_playback_decoder():
+    global playback_decoder
+    from playback import PlaybackDecoder
+    stop_playback_decoder()
+    if video_path:
+        path, index = preview_source()
+        playback_decoder = PlaybackDecoder(path, index=index)
+        playback_decoder.set_speed(playback_speed)
+        playback_decoder.start(current_frame)
+
+def stop_playback_decoder():
+    global playback_decoder
+    if playback_decoder:
+        playback_decoder.stop()
+        playback_decoder = None
+
+# Only real jumps (slider, start/end buttons) make the decoder seek
+def seek_playback(frame_index):
+    if playback_decoder:
+        playback_decoder.seek(frame_index)
+    if playback_clock:
+        playback_clock.start(frame_index)
+
+def stop_at_end():
+    global current_frame, is_playing
+    current_frame = 0
+    is_playing = False
+    play_button.configure(text="Play")
+    audio_player.stop()
+    stop_playback_decoder()
 
+# Each tick shows whatever frame the clock says is due, so a slow frame is
+# made up by dropping frames instead of letting the video drift behind the audio
 def play_video():
-    global is_playing, current_frame
+    global current_frame, preview_base
     
     if not is_playing or cap is None:
         return
     
-    if current_frame >= total_frames - 1:
-        current_frame = 0
-        is_playing = False
-        play_button.configure(text="Play")
-        stop_audio_playback()
+    target = int(playback_clock.frame())
+    if target >= total_frames - 1:
+        stop_at_end()
         return
     
-    show_frame(current_frame)
-    current_frame += int(playback_speed)
+    if playback_decoder:
+        decoded = playback_decoder.get(target)
+        if decoded is not None:
+            current_frame, frame = decoded
+            # Kept caption-free, so pausing and dragging a caption needs no decode
+            preview_base = (current_frame, frame)
+            render_preview(frame, shared=True)
+        elif playback_decoder.exhausted:
+            stop_at_end()
+            return
+    elif target != current_frame:
+        show_frame(target)
     timeline_slider.set(current_frame * 1000 / total_frames)
     
-    delay = int(1000 / (video_fps * playback_speed))
-    app.after(delay, play_video)
+    # Wake up when the next frame is due, however long this one took
+    delay = playback_clock.time_until(target + 1)
+    app.after(max(1, int(delay * 1000)), play_video)
 
 def set_playback_speed(speed):
     global playback_speed
     playback_speed = speed
     speed_label.configure(text=f"Speed: {playback_speed}x")
+    if playback_decoder:
+        playback_decoder.set_speed(speed)
+    if is_playing:
+        playback_clock.start(current_frame, speed)
+        if speed == 1.0:
+            play_audio_at(current_frame)
+        else:
+            audio_player.pause()
 
 def go_to_start():
     global current_frame
     current_frame = 0
     timeline_slider.set(0)
     show_frame(0)
+    seek_playback(0)
     # Restart audio from beginning if playing
-    if is_playing:
-        stop_audio_playback()
-        pygame.mixer.music.play(start=0)
+    seek_audio(0)
 
 def go_to_end():
     global current_frame
     current_frame = total_frames - 1
     timeline_slider.set(1000)
     show_frame(current_frame)
+    seek_playback(current_frame)
     # Stop audio if playing
     if is_playing:
-        stop_audio_playback()
+        audio_player.pause()
 
 # Caption functions
 def upload_captions():
     file_path = filedialog.askopenfilename(
-        filetypes=[("Text files", "*.txt"), ("JSON files", "*.json")]
+        filetypes=[("Text files", "*.txt"), ("Subtitle files", "*.srt *.vtt *.ass *.ssa"), ("JSON files", "*.json")]
     )
     if not file_path:
         return
     
+    from subtitles import SUBTITLE_EXTENSIONS
     if file_path.endswith('.json'):
         load_caption_project(file_path)
+    elif file_path.lower().endswith(SUBTITLE_EXTENSIONS):
+        import_subtitles(file_path)
     else:
         with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-        
-        for i, line in enumerate(lines):
-            text = line.strip()
-            if text:
-                add_caption_button(text)
-
-def add_caption_button(text):
-    frame = ctk.CTkFrame(caption_frame, fg_color="transparent")
-    frame.pack(fill="x", pady=5)
-    
-    btn = ctk.CTkButton(
-        frame,
-        text=text,
-        width=200,
-        height=30,
-        command=lambda t=text: add_caption_to_canvas(t)
-    )
-    btn.pack(side="left", padx=(0, 5))
+            transcript_lines.extend(text for text in (line.strip() for line in f) if text)
+        transcript_list.refresh()
+
+# Timed captions from an SRT/WebVTT/ASS file, added to the caption list in one go
+def import_subtitles(file_path):
+    from subtitles import load_subtitles
+    if not cap:
+        messagebox.showerror("Error", "Load a video first so subtitle times can be mapped to frames")
+        return
+    
+    try:
+        new_captions = load_subtitles(file_path, video_fps, total_frames)
+    except (OSError, ValueError) as e:
+        messagebox.showerror("Error", f"Failed to import subtitles: {str(e)}")
+        return
     
-    del_btn = ctk.CTkButton(
-        frame,
+    captions.extend(new_captions)
+    caption_index.invalidate()
+    record_edit("add", captions=[caption.to_dict() for caption in new_captions])
+    show_frame(current_frame)
+    update_caption_list()
+    messagebox.showinfo("Success", f"Imported {len(new_captions)} captions")
+
+def remove_transcript_line(index):
+    del transcript_lines[index]
+    transcript_list.refresh()
+
+# Row widgets for the transcript panel. Only the rows on screen exist;
+# VirtualList re-fills them with fill_transcript_row as the panel scrolls.
+def make_transcript_row(parent):
+    row = ctk.CTkFrame(parent, fg_color="transparent")
+    row.button = ctk.CTkButton(row, text="", width=200, height=30)
+    row.button.pack(side="left", padx=(0, 5))
+    row.delete_button = ctk.CTkButton(
+        row,
         text="X",
         width=30,
         height=30,
         fg_color="red",
-        hover_color="darkred",
-        command=lambda f=frame, b=btn: remove_caption_button(f, b)
+        hover_color="darkred"
     )
-    del_btn.pack(side="right")
-    
-    caption_buttons.append((frame, btn, del_btn))
+    row.delete_button.pack(side="right")
+    return row
 
-def remove_caption_button(frame, button):
-    frame.destroy()
-    caption_buttons[:] = [cb for cb in caption_buttons if cb[1] != button]
+def fill_transcript_row(row, index, text):
+    row.button.configure(text=text, command=lambda t=text: add_caption_to_canvas(t))
+    row.delete_button.configure(command=lambda i=index: remove_transcript_line(i))
 
 def add_caption_to_canvas(text):
+    from caption_core import Caption
     x, y = 480, 270
     new_caption = Caption(text, x, y, current_frame, total_frames-1)
     captions.append(new_caption)
+    caption_index.add(new_caption)
+    record_edit("add", captions=[new_caption.to_dict()])
     select_caption(new_caption)
     show_frame(current_frame)
     update_caption_list()
+    caption_list.see(len(captions) - 1)
 
 def select_caption(caption):
     global selected_caption
@@ -439,11 +641,12 @@ def select_caption(caption):
         color_entry.insert(0, caption.color)
         
         # Set the font dropdown to the caption's font
-        if caption.font_name in available_fonts:
+        if caption.font_name in system_fonts:
             font_dropdown.set(caption.font_name)
         else:
             font_dropdown.set("arial.ttf")
     
+    caption_list.refresh()
     show_frame(current_frame)
 
 def update_caption_properties():
@@ -454,39 +657,52 @@ def update_caption_properties():
             if not (0 <= start <= end <= total_frames - 1):
                 messagebox.showerror("Error", f"Frames must be between 0 and {total_frames - 1}, with start <= end")
                 return
-            selected_caption.start_frame = start
-            selected_caption.end_frame = end
+            old_start, old_end = selected_caption.start_frame, selected_caption.end_frame
+            if (start, end) != (old_start, old_end):
+                selected_caption.start_frame = start
+                selected_caption.end_frame = end
+                caption_index.move(selected_caption, old_start, old_end)
         except ValueError:
             messagebox.showerror("Error", "Frame values must be integers")
             return
         
+        from caption_core import sprite_cache
+        sprite_cache.invalidate(selected_caption)
         selected_caption.text = caption_text.get()
         selected_caption.font_size = int(font_size_slider.get())
         selected_caption.color = color_entry.get()
         selected_caption.font_name = font_dropdown.get()
+        record_edit("set", index=captions.index(selected_caption), caption=selected_caption.to_dict())
         
         show_frame(current_frame)
         update_caption_list()
 
+# Only re-fills the rows on screen, so it is cheap to call after any edit
 def update_caption_list():
-    for widget in caption_list_frame.winfo_children():
-        widget.destroy()
-    
-    for i, caption in enumerate(captions):
-        btn = ctk.CTkButton(
-            caption_list_frame,
-            text=f"{i+1}. {caption.text[:20]}{'...' if len(caption.text) > 20 else ''}",
-            command=lambda c=caption: select_caption(c)
-        )
-        btn.pack(fill="x", pady=2)
-        if caption.selected:
-            btn.configure(fg_color="blue")
+    caption_list.set_items(captions)
+
+def make_caption_row(parent):
+    row = ctk.CTkFrame(parent, fg_color="transparent")
+    row.button = ctk.CTkButton(row, text="")
+    row.button.pack(fill="x")
+    row.default_color = row.button.cget("fg_color")
+    return row
+
+def fill_caption_row(row, index, caption):
+    row.button.configure(
+        text=f"{index+1}. {caption.text[:20]}{'...' if len(caption.text) > 20 else ''}",
+        fg_color="blue" if caption.selected else row.default_color,
+        command=lambda c=caption: select_caption(c)
+    )
 
 def delete_selected_caption():
     global selected_caption
     
     if selected_caption:
-        captions.remove(selected_caption)
+        index = captions.index(selected_caption)
+        del captions[index]
+        caption_index.invalidate()
+        record_edit("delete", index=index)
         selected_caption = None
         show_frame(current_frame)
         update_caption_list()
@@ -499,22 +715,31 @@ def delete_selected_caption():
         font_dropdown.set("arial.ttf")
 
 # Dragging captions
-drag_data = {"x": 0, "y": 0, "caption": None}
+# While dragging, the frame with every other caption already drawn on it is
+# kept as "background", so each motion event only blends the dragged caption.
+drag_data = {"x": 0, "y": 0, "caption": None, "moved": False, "background": None}
+HIT_SLOP = 4  # pixels around a caption that still pick it up
 
 def on_drag_start(event):
-    for caption in captions:
-        font = get_font(caption.font_name, caption.font_size)
-        bbox = font.getbbox(caption.text)
-        text_width = bbox[2] - bbox[0]
-        text_height = bbox[3] - bbox[1]
-        if (caption.x - text_width/2 <= event.x <= caption.x + text_width/2 and
-            caption.y - text_height/2 <= event.y <= caption.y + text_height/2):
+    # Topmost first, using the boxes of the captions on screen
+    for caption, left, top, right, bottom in reversed(caption_boxes):
+        if (left - HIT_SLOP <= event.x <= right + HIT_SLOP and
+            top - HIT_SLOP <= event.y <= bottom + HIT_SLOP):
             drag_data["caption"] = caption
             drag_data["x"] = event.x
             drag_data["y"] = event.y
             select_caption(caption)
+            drag_data["background"] = drag_background(caption)
             break
 
+# The frame on screen with every caption but the dragged one drawn on it
+def drag_background(caption):
+    if preview_base is None or preview_base[0] != current_frame:
+        return None
+    others = [c for c in caption_index.at(current_frame) if c is not caption]
+    background, _ = composite_captions(preview_base[1], others, shared=True)
+    return background
+
 def on_drag_motion(event):
     if drag_data["caption"] is not None:
         caption = drag_data["caption"]
@@ -522,77 +747,209 @@ def on_drag_motion(event):
         dy = event.y - drag_data["y"]
         caption.x += dx
         caption.y += dy
+        drag_data["moved"] = True
         drag_data["x"] = event.x
         drag_data["y"] = event.y
-        show_frame(current_frame)
+        if is_playing:
+            return  # the next played frame shows it
+        
+        if drag_data["background"] is None:
+            show_frame(current_frame)
+            drag_data["background"] = drag_background(caption)
+            return
+        background = drag_data["background"]
+        t = time.perf_counter()
+        preview, _ = composite_captions(background, [caption], shared=True, out=display_buffer(background))
+        t = preview_timer.add("composite", t)
+        display_preview(preview)
+        preview_timer.add("display", t)
 
 def on_drag_release(event):
+    caption = drag_data["caption"]
+    if caption is not None and drag_data["moved"] and caption in captions:
+        record_edit("set", index=captions.index(caption), caption=caption.to_dict())
+        # Redraw in list order, which also refreshes the hit-test boxes
+        show_frame(current_frame)
     drag_data["caption"] = None
+    drag_data["moved"] = False
+    drag_data["background"] = None
+
+# Autosave
+# Every edit is appended to the project's journal as it happens; loading the
+# project replays it. Untitled sessions journal to the cache dir and are
+# offered back on the next start.
+def autosave_project_path():
+    from media_cache import cache_dir
+    return os.path.join(cache_dir("autosave"), "untitled.cproj")
+
+def record_edit(op, **fields):
+    global journal
+    if journal is None:
+        from project_journal import ProjectJournal, journal_path_for
+        journal = ProjectJournal(journal_path_for(autosave_project_path()), None)
+    try:
+        journal.record(op, **fields)
+    except OSError as e:
+        print(f"Autosave error: {e}")
+        return
+    if journal.needs_compaction():
+        compact_journal()
+
+# Fold the journal into the project file and start a new one
+def compact_journal():
+    from caption_core import save_project
+    try:
+        journal.reset(save_project(project_path or autosave_project_path(), video_path, captions))
+    except OSError as e:
+        print(f"Autosave error: {e}")
+
+def switch_project(path, project_journal):
+    global project_path, journal
+    if journal:
+        if project_path is None:
+            discard_autosave(journal)
+        else:
+            journal.close()
+    project_path = path
+    journal = project_journal
+
+# autosave_journal is the open autosave journal, if there is one; discard()
+# closes it before deleting, as Windows cannot delete a file that is still open
+def discard_autosave(autosave_journal=None):
+    from project_journal import ProjectJournal, journal_path_for
+    path = autosave_project_path()
+    if autosave_journal is None:
+        autosave_journal = ProjectJournal(journal_path_for(path), None)
+    try:
+        autosave_journal.discard()
+    except OSError as e:
+        print(f"Autosave error: {e}")
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Autosave error: {e}")
+
+def offer_recovery():
+    global journal
+    from project_journal import journal_path_for, open_journal
+    path = autosave_project_path()
+    if not (os.path.exists(path) or os.path.exists(journal_path_for(path))):
+        return
+    
+    try:
+        if os.path.exists(path):
+            from caption_core import read_project
+            recovered_video_path, recovered_captions, recovered_journal = read_project(path)
+        else:
+            recovered_captions = []
+            recovered_video_path, recovered_journal = open_journal(path, None, None, recovered_captions)
+    except Exception as e:
+        print(f"Autosave error: {e}")
+        discard_autosave()
+        return
+    
+    if (recovered_captions or recovered_video_path) and messagebox.askyesno(
+            "Recover", f"Recover {len(recovered_captions)} captions from a session that was not saved?"):
+        if open_project(recovered_video_path, recovered_captions):
+            journal = recovered_journal
+            return
+    discard_autosave(recovered_journal)
 
 # Project management
 def save_caption_project():
+    from caption_core import save_project
+    from project_journal import ProjectJournal, journal_path_for
     if not video_path:
         messagebox.showerror("Error", "No video loaded")
         return
     
     file_path = filedialog.asksaveasfilename(
-        defaultextension=".json",
-        filetypes=[("JSON files", "*.json")]
+        defaultextension=".cproj",
+        filetypes=[("Caption projects", "*.cproj"), ("JSON files", "*.json")]
     )
     if not file_path:
         return
     
-    project_data = {
-        "video_path": video_path,
-        "captions": [caption.to_dict() for caption in captions]
-    }
-    
-    with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(project_data, f, indent=4)
+    try:
+        journal_id = save_project(file_path, video_path, captions)
+    except OSError as e:
+        messagebox.showerror("Error", f"Failed to save project: {str(e)}")
+        return
+    switch_project(file_path, ProjectJournal(journal_path_for(file_path), journal_id))
     
     messagebox.showinfo("Success", "Project saved successfully")
 
-def load_caption_project(file_path=None):
-    global video_path, cap, total_frames, video_fps, current_frame, captions, stop_audio
+# Show a loaded project's video (if any) and captions; False if the video failed to open
+def open_project(project_video_path, project_captions):
+    global video_path, cap, total_frames, video_fps, current_frame, captions, selected_caption
+    import cv2
     
-    if not file_path:
-        file_path = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json")]
-        )
-        if not file_path:
-            return
-    
-    try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            project_data = json.load(f)
-        
-        video_path = project_data["video_path"]
+    if project_video_path:
+        video_path = project_video_path
         if cap:
             cap.release()
         
+        close_preview_cache()
+        close_proxy()
+        clear_filmstrip()
         cap = cv2.VideoCapture(video_path)
         
         if not cap.isOpened():
             messagebox.showerror("Error", "Failed to load video from project. Ensure the file exists and is supported.")
-            return
+            return False
+        
+        open_video_index()
+        audio_player.prepare(video_path)
         
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        video_fps = int(cap.get(cv2.CAP_PROP_FPS))
+        video_fps = cap.get(cv2.CAP_PROP_FPS)
         timeline_slider.configure(to=1000)
         current_frame = 0
         timeline_slider.set(0)
+        open_preview_cache()
+        open_proxy()
+    
+    captions = project_captions
+    caption_index.set_captions(captions)
+    selected_caption = None
+    
+    show_frame(0)
+    update_caption_list()
+    return True
+
+def load_caption_project(file_path=None):
+    from caption_core import read_project
+    
+    if not file_path:
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Caption projects", "*.cproj *.json"), ("JSON files", "*.json")]
+        )
+        if not file_path:
+            return
+    
+    if is_playing:
+        toggle_playback()
+    
+    try:
+        project_video_path, project_captions, project_journal = read_project(file_path)
         
-        captions = [Caption.from_dict(data) for data in project_data["captions"]]
-        
-        show_frame(0)
-        update_caption_list()
+        if not open_project(project_video_path, project_captions):
+            project_journal.close()
+            return
+        switch_project(file_path, project_journal)
         
-        messagebox.showinfo("Success", "Project loaded successfully")
+        message = "Project loaded successfully"
+        if project_journal.entries:
+            message += f" ({project_journal.entries} autosaved edits restored)"
+        messagebox.showinfo("Success", message)
         
     except Exception as e:
         messagebox.showerror("Error", f"Failed to load project: {str(e)}")
 
 def export_video():
+    from export_engine import run_export
     if not video_path or not cap:
         messagebox.showerror("Error", "No video loaded")
         return
@@ -604,267 +961,436 @@ def export_video():
     if not output_path:
         return
     
-    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-    fps = video_fps
-    
-    fourcc = cv2.VideoWriter_fourcc(*'H264')
-    out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
+    if use_render_queue:
+        submit_to_render_queue(output_path)
+        return
     
     progress = ctk.CTkToplevel(app)
     progress.title("Exporting")
-    progress.geometry("300x100")
+    progress.geometry("420x240")
     progress_label = ctk.CTkLabel(progress, text="Exporting video...")
     progress_label.pack(pady=10)
-    progress_bar = ctk.CTkProgressBar(progress, width=250)
+    progress_bar = ctk.CTkProgressBar(progress, width=380)
     progress_bar.pack(pady=10)
     progress_bar.set(0)
+    stats_label = ctk.CTkLabel(progress, text="", justify="left", anchor="w")
+    stats_label.pack(padx=10, pady=5, fill="x")
     progress.update()
     
+    # Per-stage timings, refreshed while the export runs (segmented mode
+    # reports each segment when its worker finishes)
+    timer = StageTimer()
+    trace_path = trace_path_for(output_path) if export_trace else None
+    mode = export_mode
+    
+    def refresh_stats():
+        if not progress.winfo_exists() or mode == "segmented":
+            return
+        stats_label.configure(text=format_summary(timer.summary(exact=False)))
+        app.after(500, refresh_stats)
+    
+    refresh_stats()
+    
+    def on_progress(frame_num, total):
+        app.after(0, lambda n=frame_num: progress_bar.set(n / total))
+        app.after(0, lambda n=frame_num: progress_label.configure(text=f"Exporting... {int(n / total * 100)}%"))
+    
+    def show_stages(stages):
+        if progress.winfo_exists():
+            stats_label.configure(text=format_summary(stages))
+    
+    def on_stages(stages):
+        app.after(0, lambda: show_stages(stages))
+    
     def export_thread():
-        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-        aspect_ratio = width / height
-        preview_aspect = 960 / 540
-        x_scale = width / 960 if aspect_ratio >= preview_aspect else height / 540 * aspect_ratio
-        y_scale = height / 540 if aspect_ratio <= preview_aspect else width / 960 / aspect_ratio
-        
-        for frame_num in range(total_frames):
-            ret, frame = cap.read()
-            if not ret:
-                break
-            
-            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_img = Image.fromarray(frame_rgb)
-            draw = ImageDraw.Draw(pil_img)
-            
-            for caption in captions:
-                if caption.start_frame <= frame_num <= caption.end_frame:
-                    font = get_font(caption.font_name, caption.font_size)
-                    x = int(caption.x * x_scale)
-                    y = int(caption.y * y_scale)
-                    draw.text((x, y), caption.text, font=font, fill=caption.color)
-            
-            frame_with_text = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-            out.write(frame_with_text)
-            
-            app.after(0, lambda n=frame_num: progress_bar.set(n / total_frames))
-            app.after(0, lambda n=frame_num: progress_label.configure(text=f"Exporting... {int(n / total_frames * 100)}%"))
+        try:
+            if mode == "segmented":
+                stats = export_in_process(video_path, list(captions), output_path, mode, on_progress, on_stages,
+                                          trace_path)
+            else:
+                stats = run_export(video_path, list(captions), output_path, mode, on_progress,
+                                   timer=timer, trace_path=trace_path)
+        except Exception as e:
+            app.after(0, progress.destroy)
+            app.after(0, lambda err=e: messagebox.showerror("Error", f"Export failed: {err}"))
+            return
         
-        out.release()
+        message = (f"Video exported successfully\n\n{stats['frames']} frames at {stats['fps']:.1f} fps\n"
+                   f"{format_summary(stats['stages'])}")
+        if trace_path:
+            message += f"\n\nTrace: {trace_path}"
         app.after(0, progress.destroy)
-        app.after(0, lambda: messagebox.showinfo("Success", "Video exported successfully"))
+        app.after(0, lambda: messagebox.showinfo("Success", message))
     
     threading.Thread(target=export_thread, daemon=True).start()
 
+# Segmented export runs a process pool, which must neither fork the editor
+# (Tk, playback threads and their locks) nor re-import it, so it runs in
+# export_worker.py on a snapshot of the project
+def export_in_process(source, snapshot, output_path, mode, on_progress, on_stages, trace_path=None):
+    global export_process
+    import json
+    import tempfile
+    from caption_core import save_project
+    from media_cache import cache_dir
+    
+    fd, project = tempfile.mkstemp(suffix=".cproj", dir=cache_dir("exports"))
+    os.close(fd)
+    try:
+        save_project(project, source, snapshot)
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "export_worker.py"),
+                   project, output_path, "--mode", mode]
+        if trace_path:
+            command += ["--trace", trace_path]
+        export_process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+        result = {}
+        for line in export_process.stdout:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue  # something the export printed
+            if not isinstance(message, dict):
+                continue
+            if "progress" in message:
+                on_progress(*message["progress"])
+                on_stages(message["stages"])
+            else:
+                result = message
+        export_process.wait()
+    finally:
+        export_process = None
+        os.remove(project)
+    
+    if "stats" in result:
+        return result["stats"]
+    raise RuntimeError(result.get("error", "the export process exited unexpectedly"))
+
+def set_export_mode(mode):
+    global export_mode
+    export_mode = mode
+    if mode == "smart":
+        messagebox.showwarning("Smart render", "Smart render is experimental and has not been verified on a wide "
+                               "range of footage. It falls back to a full render when the result does not have "
+                               "the source's frame count, but check the exported video before using it.")
+
+def set_export_trace():
+    global export_trace
+    export_trace = bool(export_trace_check.get())
+
+# Hand the export to the local render queue (render_server.py), so it does not
+# compete with the editor for CPU. The queue renders a snapshot of the project.
+def submit_to_render_queue(output_path):
+    from caption_core import save_project
+    from render_server import queued_project_path, submit_job
+    
+    project_path = queued_project_path()
+    try:
+        save_project(project_path, video_path, captions)
+        job = submit_job(project_path, output_path, export_mode)
+    except OSError as e:
+        messagebox.showerror("Error", f"Could not reach the render queue: {e}\n\nStart it with: python render_server.py")
+        return
+    
+    messagebox.showinfo("Queued", f"Export queued as job {job['id']}.\nCheck progress with: python render_server.py status")
+
+def set_use_render_queue():
+    global use_render_queue
+    use_render_queue = bool(render_queue_check.get())
+
 def download_clip():
     if not video_path or not cap:
         messagebox.showerror("Error", "No video loaded")
         return
     
-    # Create a simple dialog to select start and end time
+    # Dialog taking one "start-end" range per line (seconds or h:mm:ss)
     clip_dialog = ctk.CTkToplevel(app)
-    clip_dialog.title("Download Clip")
-    clip_dialog.geometry("400x200")
+    clip_dialog.title("Download Clips")
+    clip_dialog.geometry("420x360")
+    duration = total_frames / video_fps
     
-    ctk.CTkLabel(clip_dialog, text="Start Time (seconds):").pack(pady=5)
-    start_time_entry = ctk.CTkEntry(clip_dialog)
-    start_time_entry.pack(pady=5)
-    start_time_entry.insert(0, "0")
+    ctk.CTkLabel(clip_dialog, text="Clips, one start-end per line (seconds or h:mm:ss):").pack(pady=5)
+    ranges_text = ctk.CTkTextbox(clip_dialog, width=380, height=150)
+    ranges_text.pack(pady=5)
+    ranges_text.insert("1.0", f"0-{int(duration)}")
     
-    ctk.CTkLabel(clip_dialog, text="End Time (seconds):").pack(pady=5)
-    end_time_entry = ctk.CTkEntry(clip_dialog)
-    end_time_entry.pack(pady=5)
-    end_time_entry.insert(0, str(int(total_frames / video_fps)))
+    accurate_check = ctk.CTkCheckBox(clip_dialog, text="Frame-accurate start (experimental, re-encodes up to one GOP per clip)")
+    accurate_check.pack(pady=5)
+    
+    status_label = ctk.CTkLabel(clip_dialog, text="")
+    status_label.pack(pady=5)
     
     def process_clip():
+        from clip_extract import clip_output_paths, parse_ranges
         try:
-            start_time = float(start_time_entry.get())
-            end_time = float(end_time_entry.get())
-            
-            if start_time < 0 or end_time > total_frames / video_fps or start_time >= end_time:
-                messagebox.showerror("Error", "Invalid time range")
-                return
-            
+            ranges = parse_ranges(ranges_text.get("1.0", "end"))
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid clip range: {str(e)}")
+            return
+        if not ranges or any(end_time > duration for _, end_time in ranges):
+            messagebox.showerror("Error", "Invalid time range")
+            return
+        
+        if len(ranges) == 1:
             output_path = filedialog.asksaveasfilename(
                 defaultextension=".mp4",
                 filetypes=[("MP4 files", "*.mp4")]
             )
             if not output_path:
                 return
-            
-            # Use ffmpeg to extract the clip
-            cmd = [
-                'ffmpeg', '-i', video_path,
-                '-ss', str(start_time),
-                '-to', str(end_time),
-                '-c', 'copy',
-                output_path
-            ]
-            
-            # Run the command
-            subprocess.run(cmd, check=True)
-            messagebox.showinfo("Success", "Clip downloaded successfully")
-            clip_dialog.destroy()
-            
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to download clip: {str(e)}")
+            output_paths = [output_path]
+        else:
+            output_dir = filedialog.askdirectory(title="Folder for the clips")
+            if not output_dir:
+                return
+            output_paths = clip_output_paths(video_path, ranges, output_dir)
+        
+        clip_button.configure(state="disabled")
+        status_label.configure(text=f"Cutting {len(ranges)} clip(s)...")
+        source = video_path
+        accurate = bool(accurate_check.get())
+        
+        def show_progress(done, total):
+            if clip_dialog.winfo_exists():
+                status_label.configure(text=f"{done}/{total} clips done")
+        
+        def on_progress(done, total):
+            app.after(0, lambda: show_progress(done, total))
+        
+        # Cut off the UI thread; ffmpeg runs several clips at once
+        def extract_thread():
+            from clip_extract import extract_clips
+            try:
+                results = extract_clips(source, ranges, output_paths, accurate, progress_callback=on_progress)
+            except Exception as e:
+                app.after(0, lambda err=e: finish(f"Failed to download clips: {str(err)}"))
+                return
+            failed = [f"{os.path.basename(path)}: {error}" for path, error in results if error]
+            if failed:
+                app.after(0, lambda: finish(f"{len(failed)} of {len(results)} clips failed:\n" + "\n".join(failed[:5])))
+            else:
+                app.after(0, lambda: finish(None, len(results)))
+        
+        def finish(error, count=0):
+            if error:
+                messagebox.showerror("Error", error)
+                if clip_dialog.winfo_exists():
+                    clip_button.configure(state="normal")
+                    status_label.configure(text="")
+                return
+            messagebox.showinfo("Success", "Clip downloaded successfully" if count == 1 else f"{count} clips downloaded successfully")
+            if clip_dialog.winfo_exists():
+                clip_dialog.destroy()
+        
+        threading.Thread(target=extract_thread, daemon=True).start()
     
-    ctk.CTkButton(clip_dialog, text="Download Clip", command=process_clip).pack(pady=20)
+    clip_button = ctk.CTkButton(clip_dialog, text="Download Clips", command=process_clip)
+    clip_button.pack(pady=10)
 
 # Cleanup
 def cleanup():
+    if "--preview-stats" in sys.argv:
+        print(format_summary(preview_timer.summary()))
+    stop_playback_decoder()
+    close_preview_cache()
+    close_proxy()
     if cap:
         cap.release()
-    stop_audio_playback()
+    audio_player.close()
+    if journal:
+        journal.close()
+    if export_process:
+        export_process.terminate()
     app.destroy()
 
-app.protocol("WM_DELETE_WINDOW", cleanup)
 
-# UI Layout
-# Create a top frame for the download button
-top_frame = ctk.CTkFrame(app, height=50)
-top_frame.pack(side="top", fill="x", padx=10, pady=5)
-top_frame.pack_propagate(False)
+# Worker processes started with "spawn" re-import this script as __mp_main__,
+# and must not build a second editor
+if __name__ == "__main__":
+    # App setup
+    ctk.set_appearance_mode("dark")
+    ctk.set_default_color_theme("blue")
+    
+    app = ctk.CTk()
+    app.geometry("1400x900")
+    app.title("Caption tool")
+    app.protocol("WM_DELETE_WINDOW", cleanup)
+    
+    # UI Layout
+    # Create a top frame for the download button
+    top_frame = ctk.CTkFrame(app, height=50)
+    top_frame.pack(side="top", fill="x", padx=10, pady=5)
+    top_frame.pack_propagate(False)
+
+    # Add download button to top right
+    download_btn = ctk.CTkButton(top_frame, text="Download Clip", command=download_clip, 
+                                fg_color="purple", hover_color="darkpurple", height=40)
+    download_btn.pack(side="right", padx=5)
+
+    # Add export button next to it
+    export_btn = ctk.CTkButton(top_frame, text="Export Video", command=export_video, 
+                              fg_color="green", hover_color="darkgreen", height=40)
+    export_btn.pack(side="right", padx=5)
 
-# Add download button to top right
-download_btn = ctk.CTkButton(top_frame, text="Download Clip", command=download_clip, 
-                            fg_color="purple", hover_color="darkpurple", height=40)
-download_btn.pack(side="right", padx=5)
+    export_mode_menu = ctk.CTkOptionMenu(top_frame, values=EXPORT_MODE_NAMES, command=set_export_mode, width=120)
+    export_mode_menu.set(export_mode)
+    export_mode_menu.pack(side="right", padx=5)
 
-# Add export button next to it
-export_btn = ctk.CTkButton(top_frame, text="Export Video", command=export_video, 
-                          fg_color="green", hover_color="darkgreen", height=40)
-export_btn.pack(side="right", padx=5)
+    export_trace_check = ctk.CTkCheckBox(top_frame, text="Trace", command=set_export_trace, width=70)
+    export_trace_check.pack(side="right", padx=5)
 
-left_frame = ctk.CTkFrame(app, width=300)
-left_frame.pack(side="left", fill="y", padx=10, pady=10)
-left_frame.pack_propagate(False)
+    render_queue_check = ctk.CTkCheckBox(top_frame, text="Render queue", command=set_use_render_queue, width=110)
+    render_queue_check.pack(side="right", padx=5)
 
-upload_btn = ctk.CTkButton(left_frame, text="Upload Video", command=upload_video)
-upload_btn.pack(pady=5)
+    proxy_check = ctk.CTkCheckBox(top_frame, text="Proxy", command=set_use_proxy, width=70)
+    proxy_check.pack(side="right", padx=5)
 
-play_button = ctk.CTkButton(left_frame, text="Play", command=toggle_playback)
-play_button.pack(pady=5)
+    left_frame = ctk.CTkFrame(app, width=300)
+    left_frame.pack(side="left", fill="y", padx=10, pady=10)
+    left_frame.pack_propagate(False)
 
-control_frame = ctk.CTkFrame(left_frame, fg_color="transparent")
-control_frame.pack(pady=5)
+    upload_btn = ctk.CTkButton(left_frame, text="Upload Video", command=upload_video)
+    upload_btn.pack(pady=5)
 
-start_btn = ctk.CTkButton(control_frame, text="<<", width=30, command=go_to_start)
-start_btn.pack(side="left", padx=2)
+    play_button = ctk.CTkButton(left_frame, text="Play", command=toggle_playback)
+    play_button.pack(pady=5)
 
-speed_down_btn = ctk.CTkButton(control_frame, text="-", width=30, 
-                              command=lambda: set_playback_speed(max(0.25, playback_speed - 0.25)))
-speed_down_btn.pack(side="left", padx=2)
+    control_frame = ctk.CTkFrame(left_frame, fg_color="transparent")
+    control_frame.pack(pady=5)
 
-speed_label = ctk.CTkLabel(control_frame, text="Speed: 1.0x")
-speed_label.pack(side="left", padx=5)
+    start_btn = ctk.CTkButton(control_frame, text="<<", width=30, command=go_to_start)
+    start_btn.pack(side="left", padx=2)
 
-speed_up_btn = ctk.CTkButton(control_frame, text="+", width=30, 
-                            command=lambda: set_playback_speed(min(4.0, playback_speed + 0.25)))
-speed_up_btn.pack(side="left", padx=2)
+    speed_down_btn = ctk.CTkButton(control_frame, text="-", width=30, 
+                                  command=lambda: set_playback_speed(max(0.25, playback_speed - 0.25)))
+    speed_down_btn.pack(side="left", padx=2)
 
-end_btn = ctk.CTkButton(control_frame, text=">>", width=30, command=go_to_end)
-end_btn.pack(side="left", padx=2)
+    speed_label = ctk.CTkLabel(control_frame, text="Speed: 1.0x")
+    speed_label.pack(side="left", padx=5)
 
-# Volume control
-volume_frame = ctk.CTkFrame(left_frame, fg_color="transparent")
-volume_frame.pack(pady=5)
+    speed_up_btn = ctk.CTkButton(control_frame, text="+", width=30, 
+                                command=lambda: set_playback_speed(min(4.0, playback_speed + 0.25)))
+    speed_up_btn.pack(side="left", padx=2)
 
-volume_label = ctk.CTkLabel(volume_frame, text="Volume: 100%")
-volume_label.pack()
+    end_btn = ctk.CTkButton(control_frame, text=">>", width=30, command=go_to_end)
+    end_btn.pack(side="left", padx=2)
 
-volume_slider = ctk.CTkSlider(volume_frame, from_=0, to=100, command=set_volume)
-volume_slider.set(100)
-volume_slider.pack(pady=5)
+    # Volume control
+    volume_frame = ctk.CTkFrame(left_frame, fg_color="transparent")
+    volume_frame.pack(pady=5)
 
-time_label = ctk.CTkLabel(left_frame, text="Duration: 00:00:00 / 00:00:00")
-time_label.pack(pady=5)
+    volume_label = ctk.CTkLabel(volume_frame, text="Volume: 100%")
+    volume_label.pack()
 
-caption_btn = ctk.CTkButton(left_frame, text="Upload Captions", command=upload_captions)
-caption_btn.pack(pady=5)
+    volume_slider = ctk.CTkSlider(volume_frame, from_=0, to=100, command=set_volume)
+    volume_slider.set(100)
+    volume_slider.pack(pady=5)
 
-# Create a scrollable frame for caption buttons
-caption_scroll_frame = ctk.CTkScrollableFrame(left_frame, width=280, height=150)
-caption_scroll_frame.pack(pady=5, fill="both", expand=True)
+    time_label = ctk.CTkLabel(left_frame, text="Duration: 00:00:00 / 00:00:00")
+    time_label.pack(pady=5)
 
-caption_frame = ctk.CTkFrame(caption_scroll_frame, fg_color="transparent")
-caption_frame.pack(fill="both", expand=True)
+    caption_btn = ctk.CTkButton(left_frame, text="Upload Captions", command=upload_captions)
+    caption_btn.pack(pady=5)
 
-props_label = ctk.CTkLabel(left_frame, text="Caption Properties:")
-props_label.pack(pady=(10, 5))
+    # Virtualized list of transcript lines (only the visible rows are widgets)
+    transcript_list = VirtualList(left_frame, make_transcript_row, fill_transcript_row, width=280, height=150)
+    transcript_list.set_items(transcript_lines)
+    transcript_list.pack(pady=5, fill="both", expand=True)
 
-# Make the properties frame scrollable
-props_scroll_frame = ctk.CTkScrollableFrame(left_frame, width=280, height=250)
-props_scroll_frame.pack(fill="x", pady=5)
+    props_label = ctk.CTkLabel(left_frame, text="Caption Properties:")
+    props_label.pack(pady=(10, 5))
 
-props_frame = ctk.CTkFrame(props_scroll_frame, fg_color="transparent")
-props_frame.pack(fill="x")
+    # Make the properties frame scrollable
+    props_scroll_frame = ctk.CTkScrollableFrame(left_frame, width=280, height=250)
+    props_scroll_frame.pack(fill="x", pady=5)
 
-ctk.CTkLabel(props_frame, text="Text:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
-caption_text = ctk.CTkEntry(props_frame)
-caption_text.grid(row=0, column=1, sticky="ew", padx=5, pady=2)
+    props_frame = ctk.CTkFrame(props_scroll_frame, fg_color="transparent")
+    props_frame.pack(fill="x")
 
-ctk.CTkLabel(props_frame, text="Start Frame:").grid(row=1, column=0, sticky="w", padx=5, pady=2)
-start_frame_entry = ctk.CTkEntry(props_frame)
-start_frame_entry.grid(row=1, column=1, sticky="ew", padx=5, pady=2)
+    ctk.CTkLabel(props_frame, text="Text:").grid(row=0, column=0, sticky="w", padx=5, pady=2)
+    caption_text = ctk.CTkEntry(props_frame)
+    caption_text.grid(row=0, column=1, sticky="ew", padx=5, pady=2)
 
-ctk.CTkLabel(props_frame, text="End Frame:").grid(row=2, column=0, sticky="w", padx=5, pady=2)
-end_frame_entry = ctk.CTkEntry(props_frame)
-end_frame_entry.grid(row=2, column=1, sticky="ew", padx=5, pady=2)
+    ctk.CTkLabel(props_frame, text="Start Frame:").grid(row=1, column=0, sticky="w", padx=5, pady=2)
+    start_frame_entry = ctk.CTkEntry(props_frame)
+    start_frame_entry.grid(row=1, column=1, sticky="ew", padx=5, pady=2)
 
-ctk.CTkLabel(props_frame, text="Font Size:").grid(row=3, column=0, sticky="w", padx=5, pady=2)
-font_size_slider = ctk.CTkSlider(props_frame, from_=10, to=72, number_of_steps=62)
-font_size_slider.set(24)
-font_size_slider.grid(row=3, column=1, sticky="ew", padx=5, pady=2)
+    ctk.CTkLabel(props_frame, text="End Frame:").grid(row=2, column=0, sticky="w", padx=5, pady=2)
+    end_frame_entry = ctk.CTkEntry(props_frame)
+    end_frame_entry.grid(row=2, column=1, sticky="ew", padx=5, pady=2)
 
-ctk.CTkLabel(props_frame, text="Font:").grid(row=4, column=0, sticky="w", padx=5, pady=2)
-font_dropdown = ctk.CTkOptionMenu(props_frame, values=available_fonts)
-font_dropdown.set("arial.ttf")
-font_dropdown.grid(row=4, column=1, sticky="ew", padx=5, pady=2)
+    ctk.CTkLabel(props_frame, text="Font Size:").grid(row=3, column=0, sticky="w", padx=5, pady=2)
+    font_size_slider = ctk.CTkSlider(props_frame, from_=10, to=72, number_of_steps=62)
+    font_size_slider.set(24)
+    font_size_slider.grid(row=3, column=1, sticky="ew", padx=5, pady=2)
 
-ctk.CTkLabel(props_frame, text="Color:").grid(row=5, column=0, sticky="w", padx=5, pady=2)
-color_entry = ctk.CTkEntry(props_frame)
-color_entry.insert(0, "white")
-color_entry.grid(row=5, column=1, sticky="ew", padx=5, pady=2)
+    ctk.CTkLabel(props_frame, text="Font:").grid(row=4, column=0, sticky="w", padx=5, pady=2)
+    font_dropdown = ctk.CTkOptionMenu(props_frame, values=available_fonts)
+    font_dropdown.set("arial.ttf")
+    font_dropdown.grid(row=4, column=1, sticky="ew", padx=5, pady=2)
 
-update_btn = ctk.CTkButton(props_frame, text="Update", command=update_caption_properties)
-update_btn.grid(row=6, column=0, columnspan=2, pady=5)
+    ctk.CTkLabel(props_frame, text="Color:").grid(row=5, column=0, sticky="w", padx=5, pady=2)
+    color_entry = ctk.CTkEntry(props_frame)
+    color_entry.insert(0, "white")
+    color_entry.grid(row=5, column=1, sticky="ew", padx=5, pady=2)
 
-delete_btn = ctk.CTkButton(props_frame, text="Delete Caption", fg_color="red", 
-                          hover_color="darkred", command=delete_selected_caption)
-delete_btn.grid(row=7, column=0, columnspan=2, pady=5)
+    update_btn = ctk.CTkButton(props_frame, text="Update", command=update_caption_properties)
+    update_btn.grid(row=6, column=0, columnspan=2, pady=5)
 
-props_frame.columnconfigure(1, weight=1)
+    delete_btn = ctk.CTkButton(props_frame, text="Delete Caption", fg_color="red", 
+                              hover_color="darkred", command=delete_selected_caption)
+    delete_btn.grid(row=7, column=0, columnspan=2, pady=5)
 
-list_label = ctk.CTkLabel(left_frame, text="Caption List:")
-list_label.pack(pady=(10, 5))
+    props_frame.columnconfigure(1, weight=1)
 
-# Create a scrollable frame for caption list
-caption_list_frame = ctk.CTkScrollableFrame(left_frame, width=280, height=150)
-caption_list_frame.pack(fill="both", expand=True, pady=5)
+    list_label = ctk.CTkLabel(left_frame, text="Caption List:")
+    list_label.pack(pady=(10, 5))
 
-project_frame = ctk.CTkFrame(left_frame, fg_color="transparent")
-project_frame.pack(pady=10)
+    # Virtualized caption list
+    caption_list = VirtualList(left_frame, make_caption_row, fill_caption_row, width=280, height=150)
+    caption_list.set_items(captions)
+    caption_list.pack(fill="both", expand=True, pady=5)
 
-save_btn = ctk.CTkButton(project_frame, text="Save Project", command=save_caption_project)
-save_btn.pack(side="left", padx=5)
+    project_frame = ctk.CTkFrame(left_frame, fg_color="transparent")
+    project_frame.pack(pady=10)
 
-load_btn = ctk.CTkButton(project_frame, text="Load Project", command=load_caption_project)
-load_btn.pack(side="left", padx=5)
+    save_btn = ctk.CTkButton(project_frame, text="Save Project", command=save_caption_project)
+    save_btn.pack(side="left", padx=5)
 
-right_frame = ctk.CTkFrame(app)
-right_frame.pack(side="right", fill="both", expand=True, padx=10, pady=10)
+    load_btn = ctk.CTkButton(project_frame, text="Load Project", command=load_caption_project)
+    load_btn.pack(side="left", padx=5)
 
-preview_canvas = tk.Canvas(right_frame, width=960, height=540, bg="black")
-preview_canvas.pack(pady=20)
+    right_frame = ctk.CTkFrame(app)
+    right_frame.pack(side="right", fill="both", expand=True, padx=10, pady=10)
 
-preview_canvas.bind("<Button-1>", on_drag_start)
-preview_canvas.bind("<B1-Motion>", on_drag_motion)
-preview_canvas.bind("<ButtonRelease-1>", on_drag_release)
+    preview_canvas = tk.Canvas(right_frame, width=960, height=540, bg="black")
+    preview_canvas.pack(pady=20)
+    preview_item = preview_canvas.create_image(0, 0, anchor="nw")
 
-timeline_slider = ctk.CTkSlider(
-    right_frame, from_=0, to=1000, command=on_slider_change, width=1000
-)
-timeline_slider.pack(pady=10)
+    preview_canvas.bind("<Button-1>", on_drag_start)
+    preview_canvas.bind("<B1-Motion>", on_drag_motion)
+    preview_canvas.bind("<ButtonRelease-1>", on_drag_release)
 
-app.mainloop()
+    filmstrip_canvas = tk.Canvas(right_frame, width=FILMSTRIP_WIDTH, height=54, bg="black", highlightthickness=0)
+    filmstrip_canvas.pack(pady=(0, 2))
+    filmstrip_playhead = filmstrip_canvas.create_line(0, 0, 0, 54, fill="yellow", width=2)
+    filmstrip_canvas.bind("<Button-1>", on_filmstrip_click)
+
+    timeline_slider = ctk.CTkSlider(
+        right_frame, from_=0, to=1000, command=on_slider_change, width=1000
+    )
+    timeline_slider.pack(pady=10)
+
+    # python captionedit.py --startup-time prints how long the first window took and exits;
+    # --preview-stats prints the show_frame/render_preview stage timings on exit
+    def report_startup_time():
+        app.wait_visibility()
+        app.update_idletasks()
+        print(f"Time to first window: {(time.perf_counter() - startup_began) * 1000:.0f} ms")
+        cleanup()
+
+    app.after_idle(load_fonts)
+    if "--startup-time" not in sys.argv:
+        app.after_idle(offer_recovery)
+    if "--startup-time" in sys.argv:
+        app.after(0, report_startup_time)
+    app.mainloop()
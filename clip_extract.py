@@ -0,0 +1,197 @@
+import argparse
+import bisect
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from export_engine import H264_FOURCCS, concat_segments, copy_segment, count_frames, first_idr, source_fourcc, splice_stream
+from video_index import load_or_build_index
+
+# Clip extraction. Every clip seeks on the input side (-ss before -i), so
+# ffmpeg jumps to the keyframe at or before the start instead of demuxing
+# everything in front of it, and clips are cut by a few ffmpeg processes in
+# parallel. By default clips are stream-copied and start on that keyframe.
+# With accurate=True (experimental) only the frames in front of the next IDR
+# keyframe are re-encoded, matching the source's profile, level and pixel
+# format; the rest of the video is copied and the audio is copied alongside.
+# A clip whose spliced video does not have the expected frame count, and any
+# source that is not H.264 with a keyframe index, is re-encoded instead.
+#
+#   python clip_extract.py stream.mp4 1:02:03-1:02:40 2:10:00-2:10:30 -o clips/ --accurate
+
+RANGE_SEPARATOR = re.compile(r'\s*[-,\s]\s*')
+
+# "90", "1:30" or "1:01:30.5" -> seconds
+def parse_time(text):
+    parts = text.strip().split(":")
+    if len(parts) > 3:
+        raise ValueError(f"Invalid time: {text}")
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+# One "start-end" range per line; blank lines and # comments are skipped
+def parse_ranges(text):
+    ranges = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = RANGE_SEPARATOR.split(line, maxsplit=1)
+        try:
+            if len(parts) != 2:
+                raise ValueError
+            start, end = parse_time(parts[0]), parse_time(parts[1])
+        except ValueError:
+            raise ValueError(f"Line {number}: expected 'start-end', got {line!r}")
+        if start >= end:
+            raise ValueError(f"Line {number}: the end must come after the start")
+        ranges.append((start, end))
+    return ranges
+
+def clip_output_paths(video_path, ranges, output_dir):
+    stem = os.path.splitext(os.path.basename(video_path))[0]
+    return [os.path.join(output_dir, f"{stem}_clip{i + 1:02d}_{int(start)}-{int(end)}.mp4")
+            for i, (start, end) in enumerate(ranges)]
+
+def run_ffmpeg(args, what):
+    result = subprocess.run(['ffmpeg', '-v', 'error', '-y'] + args,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to {what}: {result.stderr.strip()}")
+
+def copy_clip(video_path, start, end, output_path):
+    run_ffmpeg([
+        '-ss', f"{start:.6f}", '-i', video_path, '-t', f"{end - start:.6f}",
+        '-map', '0:v:0', '-map', '0:a?', '-c', 'copy', '-avoid_negative_ts', 'make_zero', output_path
+    ], f"copy {start:.3f}-{end:.3f}")
+
+def encode_clip(video_path, start, end, output_path):
+    run_ffmpeg([
+        '-ss', f"{start:.6f}", '-i', video_path, '-t', f"{end - start:.6f}",
+        '-map', '0:v:0', '-map', '0:a?', '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18',
+        '-c:a', 'aac', '-b:a', '192k', output_path
+    ], f"encode {start:.3f}-{end:.3f}")
+
+# First frame shown at or after the given time
+def frame_at(index, seconds):
+    return bisect.bisect_left(index.pts, seconds - 1e-6)
+
+def smart_clip(video_path, index, stream, start, end, output_path):
+    first = frame_at(index, start)
+    last = frame_at(index, end)  # exclusive
+    keyframe = first_idr(video_path, index, first, last)
+    if keyframe is None:
+        # No IDR frame inside the clip to copy from
+        encode_clip(video_path, start, end, output_path)
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="clip-", dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        pieces = []
+        if keyframe > first:
+            head = os.path.join(work_dir, "head.ts")
+            run_ffmpeg([
+                '-ss', f"{start:.6f}", '-i', video_path, '-map', '0:v:0', '-frames:v', str(keyframe - first),
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '18', '-pix_fmt', stream["pix_fmt"],
+                '-profile:v', stream["profile"], '-level', stream["level"], '-f', 'mpegts', head
+            ], f"re-encode frames {first}-{keyframe}")
+            pieces.append(head)
+        tail = os.path.join(work_dir, "tail.ts")
+        copy_segment(video_path, index, keyframe, last, tail)
+        pieces.append(tail)
+
+        video_only = os.path.join(work_dir, "video.mp4")
+        concat_segments(pieces, video_only)
+        if count_frames(video_only) != last - first:
+            print(f"Splicing {start:.3f}-{end:.3f} lost or repeated frames; re-encoding the clip")
+            encode_clip(video_path, start, end, output_path)
+            return
+        run_ffmpeg([
+            '-i', video_only, '-ss', f"{start:.6f}", '-t', f"{end - start:.6f}", '-i', video_path,
+            '-map', '0:v:0', '-map', '1:a?', '-c', 'copy', output_path
+        ], f"add audio to {output_path}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# Cut every (start, end) range, in seconds, to the matching output path.
+# Returns one (output_path, error message or None) per clip, in order;
+# progress_callback(done, total) runs on the calling thread as clips finish.
+def extract_clips(video_path, ranges, output_paths, accurate=False, workers=4, progress_callback=None):
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError("ffmpeg is required to extract clips")
+
+    index = None
+    stream = None
+    if accurate:
+        index = load_or_build_index(video_path)
+        if index.keyframes and source_fourcc(video_path) in H264_FOURCCS:
+            stream = splice_stream(video_path)
+        if stream is None:
+            print("Frame-accurate cuts are copied only from H.264 sources libx264 can match, with a keyframe index; "
+                  "re-encoding the clips")
+            index = None
+
+    def cut(start, end, output_path):
+        if not accurate:
+            copy_clip(video_path, start, end, output_path)
+        elif index is not None:
+            smart_clip(video_path, index, stream, start, end, output_path)
+        else:
+            encode_clip(video_path, start, end, output_path)
+
+    results = [(path, None) for path in output_paths]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges)))) as pool:
+        futures = {pool.submit(cut, start, end, path): i
+                   for i, ((start, end), path) in enumerate(zip(ranges, output_paths))}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                results[i] = (output_paths[i], str(e))
+            if progress_callback:
+                progress_callback(done, len(futures))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Cut clips out of a video.")
+    parser.add_argument("video", help="Source video")
+    parser.add_argument("ranges", nargs="+", help="Clip ranges as start-end, in seconds or h:mm:ss")
+    parser.add_argument("-o", "--output-dir", default=".", help="Folder for the clips (default: current folder)")
+    parser.add_argument("--accurate", action="store_true",
+                        help="Start exactly at the requested time by re-encoding up to one GOP per clip")
+    parser.add_argument("-j", "--workers", type=int, default=4, help="Clips cut at the same time (default: 4)")
+    args = parser.parse_args()
+
+    try:
+        ranges = parse_ranges("\n".join(args.ranges))
+    except ValueError as e:
+        parser.error(str(e))
+    os.makedirs(args.output_dir, exist_ok=True)
+    output_paths = clip_output_paths(args.video, ranges, args.output_dir)
+
+    began = time.perf_counter()
+    try:
+        results = extract_clips(args.video, ranges, output_paths, args.accurate, args.workers)
+    except RuntimeError as e:
+        print(f"Clip error: {e}")
+        return 1
+
+    failed = 0
+    for path, error in results:
+        if error:
+            failed += 1
+            print(f"FAILED {path}: {error}")
+        else:
+            print(f"ok     {path}")
+    print(f"{len(results) - failed}/{len(results)} clips in {time.perf_counter() - began:.1f}s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
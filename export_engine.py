@@ -0,0 +1,604 @@
+import bisect
+import json
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from fractions import Fraction
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+from caption_core import caption_scale, draw_captions
+from caption_index import ActiveCaptionSweep
+from stage_timer import StageTimer
+from video_index import IndexedSeeker, load_or_build_index
+
+# Headless export: renders captions into a video without touching the GUI.
+# Every call opens its own VideoCapture, so it is safe to run in worker processes.
+# Each mode records per-stage timings (decode, captions, composite, encode, ...)
+# into a StageTimer; run_export adds their summary to the returned stats.
+
+# Encoders
+# "opencv" uses cv2.VideoWriter, trying H.264 first and falling back to the
+# codecs every OpenCV build ships with. "ffmpeg" pipes raw BGR frames into a
+# local ffmpeg process, which allows picking the x264 preset, CRF and thread
+# count per job. "auto" picks ffmpeg when it is on the PATH.
+
+ENCODERS = ("auto", "ffmpeg", "opencv")
+OPENCV_FOURCCS = ('H264', 'avc1', 'mp4v')
+
+# stream (see splice_stream) makes the output match the source's H.264
+# profile, level, pixel format and exact frame rate, so it can be spliced with
+# pieces stream-copied from the source
+class FFmpegWriter:
+    def __init__(self, output_path, fps, width, height, preset="veryfast", crf=20, threads=0, stream=None):
+        self.output_path = output_path
+        self.frame_size = (height, width, 3)
+        rate = stream["rate"] if stream else str(fps)
+        match = ['-profile:v', stream["profile"], '-level', stream["level"]] if stream else []
+        self.process = subprocess.Popen([
+            'ffmpeg', '-v', 'error', '-y',
+            '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f"{width}x{height}", '-r', rate, '-i', '-',
+            '-an', '-c:v', 'libx264', '-preset', preset, '-crf', str(crf), '-threads', str(threads),
+            '-pix_fmt', stream["pix_fmt"] if stream else 'yuv420p'
+        ] + match + [output_path], stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    def isOpened(self):
+        return self.process.poll() is None
+
+    def write(self, frame):
+        if frame.shape != self.frame_size:
+            raise ValueError(f"Frame shape {frame.shape} does not match encoder size {self.frame_size}")
+        try:
+            self.process.stdin.write(memoryview(frame if frame.flags.c_contiguous else frame.copy()))
+        except BrokenPipeError:
+            self.release()
+
+    def release(self):
+        if self.process.stdin and not self.process.stdin.closed:
+            try:
+                self.process.stdin.close()
+            except BrokenPipeError:
+                pass
+        error = self.process.stderr.read().decode("utf-8", "replace").strip()
+        if self.process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed to encode {self.output_path}: {error}")
+
+def open_writer(output_path, fps, width, height, encoder="auto", preset="veryfast", crf=20, threads=0, stream=None):
+    if encoder not in ENCODERS:
+        raise ValueError(f"Unknown encoder: {encoder}")
+    if encoder == "auto":
+        encoder = "ffmpeg" if shutil.which('ffmpeg') else "opencv"
+
+    if encoder == "ffmpeg":
+        return FFmpegWriter(output_path, fps, width, height, preset, crf, threads, stream)
+
+    for codec in OPENCV_FOURCCS:
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*codec), fps, (width, height))
+        if out.isOpened():
+            return out
+        out.release()
+    raise RuntimeError(f"Failed to open video writer for {output_path}")
+
+def init_export_worker():
+    # One process per core already; stop OpenCV spawning its own threads on top
+    cv2.setNumThreads(1)
+
+def export_stats(frames, elapsed):
+    return {
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0
+    }
+
+# Render frames [start, end) of the video with captions burned in.
+# end=None means "until the video runs out".
+def render_range(video_path, captions, output_path, start=0, end=None, index=None, progress_callback=None,
+                 timer=None, **encoder_options):
+    if timer is None:
+        timer = StageTimer()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video: {video_path}")
+
+    try:
+        total_frames = index.frame_count if index and index.frame_count else int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        end = total_frames if end is None else min(end, total_frames)
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        x_scale, y_scale = caption_scale(width, height)
+        sweep = ActiveCaptionSweep(captions)
+        sweep.reset(start)
+
+        seeker = IndexedSeeker(cap, index)
+        if start > 0:
+            seeker.seek(start)
+
+        out = open_writer(output_path, fps, width, height, **encoder_options)
+        began = time.perf_counter()
+        frames = 0
+        try:
+            for frame_num in range(start, end):
+                t = time.perf_counter()
+                ret, frame = seeker.read()
+                t = timer.add("decode", t)
+                if not ret:
+                    break
+
+                active = sweep.advance(frame_num)
+                t = timer.add("captions", t)
+                draw_captions(frame, active, x_scale, y_scale)
+                t = timer.add("composite", t)
+                out.write(frame)
+                timer.add("encode", t)
+                frames += 1
+
+                if progress_callback:
+                    progress_callback(frame_num, total_frames)
+        finally:
+            out.release()
+        elapsed = time.perf_counter() - began
+    finally:
+        cap.release()
+
+    return export_stats(frames, elapsed)
+
+def export_captioned_video(video_path, captions, output_path, progress_callback=None, timer=None, **encoder_options):
+    return render_range(video_path, captions, output_path, progress_callback=progress_callback, timer=timer,
+                        **encoder_options)
+
+# Pipelined export
+# Decode, caption compositing and encode run on their own threads joined by
+# bounded queues, so they overlap in time. OpenCV decoding, NumPy blending and
+# the pipe write to ffmpeg all release the GIL for the heavy parts.
+
+_END = object()
+
+# Queue put/get that give up once stop is set, so a stage never blocks on a
+# queue whose other end has gone away
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _END
+
+def _drain(q):
+    try:
+        while True:
+            q.get_nowait()
+    except queue.Empty:
+        pass
+
+def _stage(work, inbox, outbox, errors, stop):
+    try:
+        while True:
+            item = _get(inbox, stop)
+            if item is _END or errors:
+                break
+            if not _put(outbox, work(item), stop):
+                break
+    except Exception as e:
+        errors.append(e)
+    finally:
+        _put(outbox, _END, stop)
+
+def export_pipelined(video_path, captions, output_path, progress_callback=None, queue_size=16, timer=None,
+                     **encoder_options):
+    if timer is None:
+        timer = StageTimer()
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Failed to open video: {video_path}")
+
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    x_scale, y_scale = caption_scale(width, height)
+    sweep = ActiveCaptionSweep(captions)
+
+    try:
+        out = open_writer(output_path, fps, width, height, **encoder_options)
+    except Exception:
+        cap.release()
+        raise
+
+    decoded = queue.Queue(maxsize=queue_size)
+    composited = queue.Queue(maxsize=queue_size)
+    errors = []
+    stop = threading.Event()  # set once the encoder stops reading, for any reason
+
+    def decode():
+        try:
+            frame_num = 0
+            while not errors:
+                t = time.perf_counter()
+                ret, frame = cap.read()
+                timer.add("decode", t)
+                if not ret:
+                    break
+                if not _put(decoded, (frame_num, frame), stop):
+                    break
+                frame_num += 1
+        except Exception as e:
+            errors.append(e)
+        finally:
+            _put(decoded, _END, stop)
+
+    def composite(item):
+        frame_num, frame = item
+        t = time.perf_counter()
+        active = sweep.advance(frame_num)
+        t = timer.add("captions", t)
+        draw_captions(frame, active, x_scale, y_scale)
+        timer.add("composite", t)
+        return frame_num, frame
+
+    threads = [
+        threading.Thread(target=decode, daemon=True),
+        threading.Thread(target=_stage, args=(composite, decoded, composited, errors, stop), daemon=True),
+    ]
+    began = time.perf_counter()
+    frames = 0
+    try:
+        for thread in threads:
+            thread.start()
+
+        # Encode on this thread
+        while True:
+            item = composited.get()
+            if item is _END:
+                break
+            frame_num, frame = item
+            t = time.perf_counter()
+            out.write(frame)
+            timer.add("encode", t)
+            frames += 1
+            if progress_callback:
+                progress_callback(frame_num, total_frames)
+    except Exception as e:
+        errors.append(e)
+    finally:
+        # Whether the encoder finished, failed or saw a failed stage's _END,
+        # the stages upstream may still be waiting on a full queue
+        stop.set()
+        for q in (decoded, composited):
+            _drain(q)
+        for thread in threads:
+            thread.join()
+        cap.release()
+        try:
+            out.release()
+        except Exception as e:
+            errors.append(e)
+
+    if errors:
+        raise errors[0]
+    return export_stats(frames, time.perf_counter() - began)
+
+# Segment-parallel export
+# The timeline is cut at keyframes into a few segments per worker. Each worker
+# process decodes, captions and encodes its own segment, then the segments are
+# joined with ffmpeg's concat demuxer without re-encoding.
+
+def plan_segments(total_frames, parts, keyframes=None):
+    bounds = [0]
+    for i in range(1, parts):
+        cut = total_frames * i // parts
+        if keyframes:
+            # Snap to the closest keyframe so no worker decodes a partial GOP
+            cut = min(keyframes, key=lambda k: abs(k - cut))
+        if bounds[-1] < cut < total_frames:
+            bounds.append(cut)
+    bounds.append(total_frames)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+def render_segment(video_path, captions, output_path, start, end, encoder_options, trace=False):
+    # Runs in a worker; the index is already cached on disk by the parent.
+    # The worker's timings go back to the parent with the stats.
+    index = load_or_build_index(video_path)
+    timer = StageTimer(trace)
+    overlapping = [c for c in captions if c.end_frame >= start and c.start_frame < end]
+    stats = render_range(video_path, overlapping, output_path, start, end, index=index, timer=timer,
+                         **encoder_options)
+    return stats, timer
+
+def concat_segments(segment_paths, output_path):
+    list_path = os.path.join(os.path.dirname(segment_paths[0]), "segments.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            escaped = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+
+    result = subprocess.run([
+        'ffmpeg', '-v', 'error', '-f', 'concat', '-safe', '0', '-i', list_path,
+        '-c', 'copy', '-y', output_path
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to join segments: {result.stderr.strip()}")
+
+def pool_context():
+    # Always spawn: forking a process that runs threads (the render queue's
+    # dispatcher, decoder threads) can copy a held lock into the child. The
+    # main script is re-imported in the workers, so it needs a __main__ guard;
+    # the editor runs segmented exports through export_worker.py for that reason.
+    return multiprocessing.get_context("spawn")
+
+def export_segmented(video_path, captions, output_path, progress_callback=None, workers=None, segments_per_worker=2,
+                     timer=None, **encoder_options):
+    if timer is None:
+        timer = StageTimer()
+    if shutil.which('ffmpeg') is None:
+        raise RuntimeError("ffmpeg is required for segmented export")
+
+    index = load_or_build_index(video_path)
+    total_frames = index.frame_count
+    if not total_frames:
+        cap = cv2.VideoCapture(video_path)
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+
+    workers = workers or os.cpu_count() or 1
+    segments = plan_segments(total_frames, workers * segments_per_worker, index.keyframes)
+    extension = os.path.splitext(output_path)[1] or ".mp4"
+    work_dir = tempfile.mkdtemp(prefix="segments-", dir=os.path.dirname(os.path.abspath(output_path)))
+    segment_paths = [os.path.join(work_dir, f"segment{i:04d}{extension}") for i in range(len(segments))]
+
+    began = time.perf_counter()
+    frames = 0
+    try:
+        with ProcessPoolExecutor(max_workers=min(workers, len(segments)), mp_context=pool_context(),
+                                 initializer=init_export_worker) as pool:
+            futures = [pool.submit(render_segment, video_path, captions, path, start, end, encoder_options, timer.trace)
+                       for path, (start, end) in zip(segment_paths, segments)]
+            for future in as_completed(futures):
+                stats, segment_timer = future.result()
+                frames += stats["frames"]
+                timer.merge(segment_timer)
+                if progress_callback:
+                    progress_callback(frames, total_frames)
+
+        t = time.perf_counter()
+        concat_segments(segment_paths, output_path)
+        timer.add("concat", t)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return export_stats(frames, time.perf_counter() - began)
+
+# Smart render (experimental)
+# Only GOPs that carry captions are decoded and re-encoded; everything else is
+# stream-copied from the source and spliced back in. Pieces are written as
+# MPEG-TS so every piece carries its own H.264 parameter sets and the final
+# concat can stream-copy them into one file. Re-encoded pieces match the
+# source's profile, level, pixel format and frame rate, copied pieces start
+# on IDR frames, and the result must have exactly the source's frame count.
+# Needs an H.264 source libx264 can match, ffmpeg and a keyframe index from
+# ffprobe; whenever one of these fails the whole video is rendered.
+
+H264_FOURCCS = ('avc1', 'h264', 'x264', 'avc3')
+X264_PROFILES = {"constrained baseline": "baseline", "baseline": "baseline", "main": "main", "high": "high"}
+SPLICE_PIX_FMTS = ('yuv420p', 'yuvj420p')
+
+def source_fourcc(video_path):
+    cap = cv2.VideoCapture(video_path)
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    cap.release()
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\0 ").lower()
+
+def plan_smart_segments(captions, total_frames, index):
+    intervals = sorted(
+        (max(0, c.start_frame), min(total_frames - 1, c.end_frame))
+        for c in captions if c.start_frame <= c.end_frame and c.end_frame >= 0 and c.start_frame < total_frames
+    )
+
+    # Widen each captioned range to whole GOPs and merge the overlaps
+    spans = []
+    for start, end in intervals:
+        gop_start = index.keyframe_before(start)
+        gop_end = index.keyframe_after(end + 1) or total_frames
+        if spans and gop_start <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], gop_end)
+        else:
+            spans.append([gop_start, gop_end])
+
+    plan = []
+    position = 0
+    for start, end in spans:
+        if position < start:
+            plan.append(("copy", position, start))
+        plan.append(("render", start, end))
+        position = end
+    if position < total_frames:
+        plan.append(("copy", position, total_frames))
+    return plan
+
+def _same_rate(a, b):
+    try:
+        a, b = Fraction(a), Fraction(b)
+    except (ValueError, ZeroDivisionError):
+        return False
+    return a > 0 and abs(a - b) <= a / 1000
+
+# The source stream's parameters a re-encoded piece must share to be spliced
+# with stream-copied ones (see FFmpegWriter), or None when libx264 cannot
+# match them: 10-bit or 4:2:2 video, variable frame rate, unknown profile or level
+def splice_stream(video_path):
+    try:
+        output = subprocess.run([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+            '-show_entries', 'stream=profile,level,pix_fmt,r_frame_rate,avg_frame_rate', '-of', 'json', video_path
+        ], check=True, capture_output=True, text=True).stdout
+        stream = json.loads(output)["streams"][0]
+        level = int(stream.get("level") or 0)
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError, IndexError):
+        return None
+
+    profile = X264_PROFILES.get(str(stream.get("profile", "")).lower())
+    rate = stream.get("r_frame_rate", "0/0")
+    if (profile is None or level < 10 or stream.get("pix_fmt") not in SPLICE_PIX_FMTS
+            or not _same_rate(rate, stream.get("avg_frame_rate", "0/0"))):
+        return None
+    return {"profile": profile, "level": f"{level // 10}.{level % 10}", "pix_fmt": stream["pix_fmt"], "rate": rate}
+
+def _seek_time(index, frame):
+    # Half a frame past the keyframe so rounding can never land on the previous one
+    return index.time_of(frame) + 0.5 / (index.fps or 30.0)
+
+# Whether the keyframe at frame is an IDR picture. Open-GOP I-frames are
+# flagged as keyframes too, but the frames after them can still reference
+# the GOP before, so a copy must not start there.
+def is_idr(video_path, index, frame):
+    data = subprocess.run([
+        'ffmpeg', '-v', 'error', '-ss', f"{_seek_time(index, frame):.6f}", '-i', video_path,
+        '-map', '0:v:0', '-frames:v', '1', '-c', 'copy', '-bsf:v', 'h264_mp4toannexb', '-f', 'h264', '-'
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+    position = data.find(b"\0\0\1")
+    while 0 <= position < len(data) - 3:
+        nal_type = data[position + 3] & 0x1F
+        if 1 <= nal_type <= 5:  # first slice of the picture
+            return nal_type == 5
+        position = data.find(b"\0\0\1", position + 3)
+    return False
+
+# First IDR keyframe in [start, end), looking at no more than limit keyframes
+def first_idr(video_path, index, start, end, limit=8):
+    first = bisect.bisect_left(index.keyframes, start)
+    for keyframe in index.keyframes[first:first + limit]:
+        if keyframe >= end:
+            break
+        if is_idr(video_path, index, keyframe):
+            return keyframe
+    return None
+
+# Video frames in a file, counted from its packets without decoding; -1 if unknown
+def count_frames(path):
+    try:
+        output = subprocess.run([
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+            '-show_entries', 'stream=nb_read_packets', '-of', 'csv=p=0', path
+        ], capture_output=True, text=True).stdout
+        return int(output.strip().split(',')[0])
+    except (OSError, ValueError):
+        return -1
+
+# Copied pieces must start on an IDR frame; frames in front of the first one
+# are rendered instead
+def idr_plan(video_path, index, plan):
+    adjusted = []
+    for action, start, end in plan:
+        split = start
+        if action == "copy":
+            split = first_idr(video_path, index, start, end)
+            if split is None:
+                split = end
+        if split > start:
+            adjusted.append(("render", start, split))
+        if split < end:
+            adjusted.append((action, split, end))
+    return adjusted
+
+def copy_segment(video_path, index, start, end, output_path):
+    result = subprocess.run([
+        'ffmpeg', '-v', 'error', '-ss', f"{_seek_time(index, start):.6f}", '-i', video_path,
+        '-map', '0:v:0', '-frames:v', str(end - start), '-c', 'copy',
+        '-bsf:v', 'h264_mp4toannexb', '-f', 'mpegts', '-y', output_path
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to copy frames {start}-{end}: {result.stderr.strip()}")
+
+def export_smart(video_path, captions, output_path, progress_callback=None, timer=None, **encoder_options):
+    if timer is None:
+        timer = StageTimer()
+    index = load_or_build_index(video_path)
+    stream = None
+    if shutil.which('ffmpeg') and index.keyframes and source_fourcc(video_path) in H264_FOURCCS:
+        stream = splice_stream(video_path)
+    if stream is None:
+        print("Smart render needs ffmpeg, an H.264 source libx264 can match and a keyframe index; "
+              "rendering the whole video")
+        return export_captioned_video(video_path, captions, output_path, progress_callback, timer, **encoder_options)
+
+    full_options = encoder_options
+    encoder_options = dict(encoder_options, encoder="ffmpeg", stream=stream)
+    total_frames = index.frame_count
+    plan = idr_plan(video_path, index, plan_smart_segments(captions, total_frames, index))
+    work_dir = tempfile.mkdtemp(prefix="smart-", dir=os.path.dirname(os.path.abspath(output_path)))
+    piece_paths = [os.path.join(work_dir, f"piece{i:04d}.ts") for i in range(len(plan))]
+
+    began = time.perf_counter()
+    frames = 0
+    rendered = 0
+    try:
+        for path, (action, start, end) in zip(piece_paths, plan):
+            if action == "copy":
+                t = time.perf_counter()
+                copy_segment(video_path, index, start, end, path)
+                timer.add("copy", t)
+                frames += end - start
+            else:
+                overlapping = [c for c in captions if c.end_frame >= start and c.start_frame < end]
+                stats = render_range(video_path, overlapping, path, start, end, index=index, timer=timer,
+                                     **encoder_options)
+                frames += stats["frames"]
+                rendered += stats["frames"]
+            if progress_callback:
+                progress_callback(frames, total_frames)
+
+        t = time.perf_counter()
+        concat_segments(piece_paths, output_path)
+        timer.add("concat", t)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    # A splice that dropped or duplicated frames plays back broken
+    produced = count_frames(output_path)
+    if produced != total_frames:
+        print(f"Smart render produced {produced} frames instead of {total_frames}; rendering the whole video")
+        return export_captioned_video(video_path, captions, output_path, progress_callback, timer, **full_options)
+
+    stats = export_stats(frames, time.perf_counter() - began)
+    stats["rendered_frames"] = rendered
+    return stats
+
+# Export modes selectable from the GUI and the batch exporter. Each takes
+# (video_path, captions, output_path, progress_callback=None, timer=None, **options);
+# every mode accepts the open_writer() encoder options.
+EXPORT_MODES = {
+    "serial": export_captioned_video,
+    "segmented": export_segmented,
+    "pipelined": export_pipelined,
+    "smart": export_smart,
+}
+
+# Pass a timer to watch the stage stats while the export runs. With trace_path
+# a Chrome trace of every stage is written there as well.
+def run_export(video_path, captions, output_path, mode="serial", progress_callback=None, timer=None,
+               trace_path=None, **options):
+    if mode not in EXPORT_MODES:
+        raise ValueError(f"Unknown export mode: {mode}")
+    if timer is None:
+        timer = StageTimer()
+    if trace_path:
+        timer.trace = True
+    stats = EXPORT_MODES[mode](video_path, captions, output_path, progress_callback=progress_callback, timer=timer,
+                               **options)
+    stats["stages"] = timer.summary()
+    if trace_path:
+        timer.write_trace(trace_path)
+    return stats
@@ -0,0 +1,48 @@
+import argparse
+import json
+import sys
+from caption_core import load_project
+from export_engine import EXPORT_MODES, run_export
+from stage_timer import StageTimer
+
+# Runs one export in a process of its own and reports on stdout, one JSON
+# object per line:
+#
+#   {"progress": [frame, total], "stages": {...}}    while it runs
+#   {"stats": {...}}  or  {"error": "..."}            when it ends
+#
+# The editor runs segmented exports through this, so their worker pool is
+# started from a plain Python process rather than from the GUI (which holds
+# Tk, the playback threads and their locks).
+#
+#   python export_worker.py snapshot.cproj output.mp4 --mode segmented --trace output.trace.json
+
+def report(message):
+    sys.stdout.write(json.dumps(message) + "\n")
+    sys.stdout.flush()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export one project and report progress as JSON lines.")
+    parser.add_argument("project", help="project file written by Save Project")
+    parser.add_argument("output", help="video to write")
+    parser.add_argument("--mode", choices=sorted(EXPORT_MODES), default="segmented")
+    parser.add_argument("--trace", help="also write a Chrome trace to this file")
+    args = parser.parse_args(argv)
+
+    timer = StageTimer()
+
+    def on_progress(frame, total):
+        report({"progress": [frame, total], "stages": timer.summary(exact=False)})
+
+    try:
+        video_path, captions = load_project(args.project)
+        stats = run_export(video_path, captions, args.output, args.mode, on_progress, timer=timer,
+                           trace_path=args.trace)
+    except Exception as e:
+        report({"error": str(e)})
+        return 1
+    report({"stats": stats})
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import json
+import os
+import platform
+import threading
+from media_cache import cache_dir
+
+# Font file name -> full path, over every font directory including nested
+# ones. Built once by walking the directories and cached on disk together
+# with the mtime of every directory walked, so a font added or removed
+# anywhere rebuilds it. The GUI loads it in the background at startup.
+
+FONT_EXTENSIONS = ('.ttf', '.ttc', '.otf')
+FONT_INDEX_VERSION = 1
+
+def font_dirs():
+    if platform.system() == "Windows":
+        return [os.path.join(os.environ.get('WINDIR', 'C:\\Windows'), 'Fonts')]
+    elif platform.system() == "Darwin":  # macOS
+        return [
+            '/Library/Fonts',
+            '/System/Library/Fonts',
+            os.path.expanduser('~/Library/Fonts')
+        ]
+    else:  # Linux
+        return [
+            '/usr/share/fonts',
+            '/usr/local/share/fonts',
+            os.path.expanduser('~/.fonts'),
+            os.path.expanduser('~/.local/share/fonts')
+        ]
+
+def dir_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None  # a missing directory is recorded too, so creating it invalidates the index
+
+def scan_fonts(dirs):
+    fonts = {}
+    mtimes = {}
+    for font_dir in dirs:
+        mtimes[font_dir] = dir_mtime(font_dir)
+        for root, subdirs, files in os.walk(font_dir):
+            subdirs.sort()
+            mtimes[root] = dir_mtime(root)
+            for font_file in sorted(files):
+                if font_file.lower().endswith(FONT_EXTENSIONS):
+                    # First match wins, like the old top-level lookup
+                    fonts.setdefault(font_file, os.path.join(root, font_file))
+    return fonts, mtimes
+
+def load_or_build_font_index(dirs=None):
+    dirs = dirs or font_dirs()
+    path = os.path.join(cache_dir("fonts"), "index.json")
+    try:
+        with open(path, 'r', encoding="utf-8") as f:
+            data = json.load(f)
+        if (data["version"] == FONT_INDEX_VERSION and data["dirs"] == dirs and
+                all(dir_mtime(d) == mtime for d, mtime in data["mtimes"].items())):
+            return data["fonts"]
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+        print(f"Ignoring unreadable font index: {e}")
+
+    fonts, mtimes = scan_fonts(dirs)
+    partial = path + ".part"
+    try:
+        with open(partial, 'w', encoding="utf-8") as f:
+            json.dump({"version": FONT_INDEX_VERSION, "dirs": dirs, "mtimes": mtimes, "fonts": fonts}, f)
+        os.replace(partial, path)
+    except OSError as e:
+        print(f"Could not cache font index: {e}")
+    return fonts
+
+class FontIndex:
+    def __init__(self, dirs=None):
+        self.dirs = dirs
+        self.fonts = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def ensure_loaded(self):
+        with self.lock:
+            if not self.loaded:
+                try:
+                    self.fonts = load_or_build_font_index(self.dirs)
+                except Exception as e:
+                    print(f"Error loading fonts: {e}")
+                self.loaded = True
+
+    # Load in a background thread; callback runs on that thread once the index is ready
+    def load_async(self, callback=None):
+        def work():
+            self.ensure_loaded()
+            if callback:
+                callback()
+
+        threading.Thread(target=work, daemon=True).start()
+
+    # Full path for a font file name, or None. Waits for a load in progress.
+    def path(self, font_name):
+        self.ensure_loaded()
+        return self.fonts.get(font_name)
+
+    def names(self):
+        self.ensure_loaded()
+        return sorted(self.fonts)
+
+    # Never blocks: False until the index has loaded
+    def __contains__(self, font_name):
+        return font_name in self.fonts
+
+system_fonts = FontIndex()
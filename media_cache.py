@@ -0,0 +1,34 @@
+import hashlib
+import os
+import platform
+
+# On-disk cache locations shared by the indexes and derived media.
+# Set CAPTIONEDIT_CACHE_DIR to move the whole cache (e.g. onto a render node's scratch disk).
+
+APP_NAME = "captionedit"
+
+def cache_root():
+    override = os.environ.get("CAPTIONEDIT_CACHE_DIR")
+    if override:
+        return override
+    if platform.system() == "Windows":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~"))
+    elif platform.system() == "Darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache"))
+    return os.path.join(base, APP_NAME)
+
+def cache_dir(kind):
+    path = os.path.join(cache_root(), kind)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+# Identity of a media file: path + size + mtime, so an edited or replaced file gets a new key
+def file_key(path):
+    st = os.stat(path)
+    identity = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+    return hashlib.sha1(identity.encode("utf-8")).hexdigest()[:20]
+
+def cache_path(kind, path, suffix):
+    return os.path.join(cache_dir(kind), file_key(path) + suffix)
@@ -0,0 +1,308 @@
+import threading
+import time
+from collections import OrderedDict, deque
+import cv2
+import numpy as np
+from caption_core import PREVIEW_WIDTH, PREVIEW_HEIGHT
+from video_index import IndexedSeeker
+
+# Playback decoding: a background thread reads frames sequentially (no
+# per-frame container seek) into a bounded ring buffer, already resized and
+# converted to RGB for the preview canvas. The UI thread only takes frames
+# out of the buffer; a real seek happens only when the playhead jumps.
+# Frames the player will never show (already late, or skipped at >1x speed)
+# are only grabbed, never retrieved or converted.
+
+# scratch: optional preview-sized BGR array the resize writes into, so only
+# the returned RGB frame is newly allocated
+def to_preview(frame, size=(PREVIEW_WIDTH, PREVIEW_HEIGHT), scratch=None):
+    # Resize first so the color conversion runs on the small image.
+    # Proxy frames (see proxy.py) are already the right size.
+    if frame.shape[1] != size[0] or frame.shape[0] != size[1]:
+        frame = cv2.resize(frame, size, dst=scratch, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+# Per-thread reusable buffers: the full-size decoded frame and its resized copy
+class DecodeBuffers:
+    def __init__(self, size):
+        self.size = size
+        self.decoded = None
+        self.small = np.empty((size[1], size[0], 3), dtype=np.uint8)
+
+    def read(self, seeker):
+        ret, frame = seeker.read(self.decoded)
+        if not ret:
+            return False, None
+        self.decoded = frame
+        return True, to_preview(frame, self.size, self.small)
+
+# The single clock playback is scheduled from. At normal speed the audio mixer
+# is the master, so the picture follows the sound; otherwise (other speeds, no
+# soundtrack yet) it is a monotonic timer anchored at the last start or seek.
+class PlaybackClock:
+    def __init__(self, fps, audio_position=None):
+        self.fps = fps
+        self.audio_position = audio_position
+        self.speed = 1.0
+        self.origin_frame = 0.0
+        self.origin_time = time.monotonic()
+
+    def start(self, frame_index, speed=None):
+        if speed is not None:
+            self.speed = speed
+        self.origin_frame = float(frame_index)
+        self.origin_time = time.monotonic()
+
+    # Fractional frame position the playhead should be at right now
+    def frame(self):
+        now = time.monotonic()
+        if self.speed == 1.0 and self.audio_position:
+            seconds = self.audio_position()
+            if seconds is not None:
+                # Re-anchor the timer so it carries on smoothly if the soundtrack ends
+                self.origin_frame = seconds * self.fps
+                self.origin_time = now
+                return self.origin_frame
+        return self.origin_frame + (now - self.origin_time) * self.fps * self.speed
+
+    # Wall-clock seconds until frame_index is due
+    def time_until(self, frame_index):
+        return (frame_index - self.frame()) / (self.fps * self.speed)
+
+class PlaybackDecoder:
+    def __init__(self, video_path, capacity=32, size=(PREVIEW_WIDTH, PREVIEW_HEIGHT), index=None):
+        self.video_path = video_path
+        self.index = index
+        self.capacity = capacity
+        self.size = size
+        self.buffer = deque()
+        self.condition = threading.Condition()
+        self.seek_to = None
+        self.position = 0  # index of the next frame the thread will decode
+        self.wanted = 0    # newest frame the player asked for; older ones are dropped
+        self.stride = 1    # at >1x speed only every stride-th frame is retrieved
+        self.finished = False
+        self.running = False
+        self.thread = None
+
+    def start(self, frame_index=0):
+        with self.condition:
+            self._seek_locked(frame_index)
+            self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.buffer.clear()
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+
+    def seek(self, frame_index):
+        with self.condition:
+            self._seek_locked(frame_index)
+
+    def set_speed(self, speed):
+        with self.condition:
+            self.stride = max(1, int(speed))
+
+    def _seek_locked(self, frame_index):
+        self.buffer.clear()
+        self.seek_to = frame_index
+        self.position = frame_index
+        self.wanted = frame_index
+        self.finished = False
+        self.condition.notify_all()
+
+    # True once the decoder has hit the end of the file and everything was consumed
+    @property
+    def exhausted(self):
+        with self.condition:
+            return self.finished and not self.buffer and self.seek_to is None
+
+    # Return (index, frame) for the newest decoded frame at or before frame_index,
+    # dropping anything older. Returns None if no frame is due yet.
+    def get(self, frame_index, timeout=0.0):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            self.wanted = frame_index
+            self.condition.notify_all()
+            while True:
+                latest = None
+                while self.buffer and self.buffer[0][0] <= frame_index:
+                    latest = self.buffer.popleft()
+                if latest is not None:
+                    self.condition.notify_all()
+                    return latest
+
+                if self.buffer:
+                    # The next decoded frame is not due yet
+                    return None
+                if self.seek_to is None and frame_index > self.position + self.capacity * self.stride:
+                    # Too far behind to decode through; jump instead
+                    self._seek_locked(frame_index)
+                elif self.finished:
+                    return None
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        seeker = IndexedSeeker(cap)
+        buffers = DecodeBuffers(self.size)
+        index = anchor = 0
+        try:
+            while True:
+                with self.condition:
+                    while self.running and self.seek_to is None and (len(self.buffer) >= self.capacity or self.finished):
+                        self.condition.wait()
+                    if not self.running:
+                        break
+                    target = self.seek_to
+                    self.seek_to = None
+                    wanted = self.wanted
+                    stride = self.stride
+
+                if target is not None:
+                    seeker.index = self.index
+                    seeker.seek(target)
+                    index = anchor = target
+
+                if index >= wanted and (index - anchor) % stride == 0:
+                    ret, frame = buffers.read(seeker)
+                else:
+                    # Dropped frame: advance the decoder without retrieving it
+                    ret, frame = seeker.grab(), None
+
+                with self.condition:
+                    if self.seek_to is not None:
+                        # A jump arrived while decoding; this frame is stale
+                        continue
+                    if not ret:
+                        self.finished = True
+                    else:
+                        if frame is not None:
+                            self.buffer.append((index, frame))
+                        self.position = index + 1
+                    self.condition.notify_all()
+                index += 1
+        finally:
+            cap.release()
+
+# Memory-bounded LRU of decoded preview frames (960x540 RGB, no captions).
+# Frames handed out are shared, so callers must copy before drawing on them.
+class FrameCache:
+    def __init__(self, max_mb=256):
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.current_bytes = 0
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, frame_index):
+        with self.lock:
+            return frame_index in self.frames
+
+    def get(self, frame_index):
+        with self.lock:
+            frame = self.frames.get(frame_index)
+            if frame is not None:
+                self.frames.move_to_end(frame_index)
+            return frame
+
+    def put(self, frame_index, frame):
+        with self.lock:
+            old = self.frames.pop(frame_index, None)
+            if old is not None:
+                self.current_bytes -= old.nbytes
+            self.frames[frame_index] = frame
+            self.current_bytes += frame.nbytes
+            while self.current_bytes > self.max_bytes and len(self.frames) > 1:
+                _, evicted = self.frames.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.current_bytes = 0
+
+# Fills a FrameCache with a window of frames around the playhead, biased in
+# the direction of travel. Only the latest request matters; a newer one
+# interrupts the window being decoded.
+class Prefetcher:
+    def __init__(self, video_path, cache, total_frames, ahead=30, behind=5, index=None):
+        self.video_path = video_path
+        self.index = index
+        self.cache = cache
+        self.total_frames = total_frames
+        self.ahead = ahead
+        self.behind = behind
+        self.pending = None
+        self.running = True
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request(self, frame_index, direction=1):
+        with self.condition:
+            self.pending = (frame_index, direction)
+            self.condition.notify()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        self.thread.join(timeout=1.0)
+
+    def _window(self, frame_index, direction):
+        if direction >= 0:
+            low, high = frame_index - self.behind, frame_index + self.ahead
+        else:
+            low, high = frame_index - self.ahead, frame_index + self.behind
+        return max(0, low), min(self.total_frames - 1, high)
+
+    def _interrupted(self):
+        with self.condition:
+            return self.pending is not None or not self.running
+
+    def _run(self):
+        cap = cv2.VideoCapture(self.video_path)
+        seeker = IndexedSeeker(cap)
+        buffers = DecodeBuffers((PREVIEW_WIDTH, PREVIEW_HEIGHT))
+        try:
+            while True:
+                with self.condition:
+                    while self.running and self.pending is None:
+                        self.condition.wait()
+                    if not self.running:
+                        break
+                    frame_index, direction = self.pending
+                    self.pending = None
+
+                low, high = self._window(frame_index, direction)
+                missing = [i for i in range(low, high + 1) if i not in self.cache]
+                if not missing:
+                    continue
+
+                seeker.index = self.index
+                seeker.seek(missing[0])
+
+                for i in range(missing[0], missing[-1] + 1):
+                    if self._interrupted():
+                        break
+                    if i in self.cache:
+                        # Still have to step over it, but skip the retrieve/convert
+                        ret = seeker.grab()
+                    else:
+                        ret, frame = buffers.read(seeker)
+                        if ret:
+                            self.cache.put(i, frame)
+                    if not ret:
+                        break
+        finally:
+            cap.release()
@@ -0,0 +1,119 @@
+import json
+import os
+
+# Append-only autosave journal, kept next to the project as
+# "<project>.journal". Every edit is one JSON line:
+#
+#   {"op":"base","id":"..."}                    first line: journal id of the saved project
+#   {"op":"add","captions":[{...}, ...]}        captions appended to the list
+#   {"op":"set","index":3,"caption":{...}}      caption 3 replaced
+#   {"op":"delete","index":3}
+#   {"op":"video","path":"..."}
+#
+# Loading a project replays the journal if its id matches the project's, so a
+# crash loses at most the edit being written. Saving the project (which the GUI
+# also does every COMPACT_AFTER edits) starts a fresh journal.
+
+COMPACT_AFTER = 1000
+
+def journal_path_for(project_path):
+    return project_path + ".journal"
+
+def _apply(entry, video_path, captions):
+    from caption_core import Caption
+    op = entry["op"]
+    if op == "add":
+        captions.extend([Caption.from_dict(data) for data in entry["captions"]])
+    elif op == "set":
+        captions[entry["index"]] = Caption.from_dict(entry["caption"])
+    elif op == "delete":
+        del captions[entry["index"]]
+    elif op == "video":
+        video_path = entry["path"]
+    else:
+        raise ValueError(f"unknown op {op!r}")
+    return video_path
+
+# Replay the journal for project_path onto (video_path, captions), which are
+# the project as saved with journal_id. Returns the replayed video path and a
+# ProjectJournal that continues after the last complete entry.
+def open_journal(project_path, journal_id, video_path, captions):
+    path = journal_path_for(project_path)
+    entries = 0
+    offset = 0
+    try:
+        with open(path, "rb") as f:
+            raw_header = f.readline()
+            try:
+                header = json.loads(raw_header) if raw_header.endswith(b"\n") else None
+            except ValueError:
+                header = None
+            if isinstance(header, dict) and header.get("op") == "base" and header.get("id") == journal_id:
+                offset = len(raw_header)
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("incomplete entry")
+                        video_path = _apply(json.loads(line), video_path, captions)
+                    except (ValueError, KeyError, IndexError, TypeError) as e:
+                        # A crash can leave the last line half written
+                        print(f"Stopped replaying {path} after {entries} edits: {e}")
+                        break
+                    entries += 1
+                    offset += len(line)
+            # Otherwise the journal predates the last save and is started over
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not read autosave journal: {e}")
+    return video_path, ProjectJournal(path, journal_id, entries, offset)
+
+def header_line(journal_id):
+    return (json.dumps({"op": "base", "id": journal_id}) + "\n").encode("utf-8")
+
+class ProjectJournal:
+    def __init__(self, path, journal_id, entries=0, offset=0):
+        self.path = path
+        self.journal_id = journal_id
+        self.entries = entries  # edits since the project was saved
+        self.offset = offset    # end of the last complete entry on disk
+        self.file = None
+
+    # Opened on the first edit, so sessions without edits never touch the disk
+    def record(self, op, **fields):
+        if self.file is None:
+            if self.offset:
+                self.file = open(self.path, "r+b")
+                self.file.truncate(self.offset)  # drop a half-written entry
+                self.file.seek(self.offset)
+            else:
+                self.file = open(self.path, "wb")
+                self.file.write(header_line(self.journal_id))
+        fields["op"] = op
+        line = (json.dumps(fields, separators=(",", ":")) + "\n").encode("utf-8")
+        self.file.write(line)
+        self.file.flush()
+        self.entries += 1
+        self.offset = self.file.tell()
+
+    def needs_compaction(self):
+        return self.entries >= COMPACT_AFTER
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    # The project was saved with journal_id; the old edits are in it now
+    def reset(self, journal_id):
+        self.close()
+        self.journal_id = journal_id
+        self.entries = 0
+        self.offset = 0
+
+    def discard(self):
+        self.reset(None)
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,52 @@
+import os
+import shutil
+import subprocess
+from caption_core import PREVIEW_WIDTH, PREVIEW_HEIGHT
+from media_cache import cache_path
+from video_index import load_or_build_index
+
+# Preview proxies: the source re-encoded once at preview size (960x540) with
+# a short GOP and no B-frames, tuned for fast decoding. Preview, scrubbing and
+# playback read the proxy; export always reads the original. Captions live in
+# 960x540 preview space already, so nothing else changes. Proxies are cached
+# on disk keyed by the source's path, size and mtime.
+
+PROXY_GOP = 12
+
+def proxy_path_for(video_path):
+    return cache_path("proxy", video_path, ".mp4")
+
+# A source no bigger than the preview gains nothing from a proxy
+def needs_proxy(width, height):
+    return width > PREVIEW_WIDTH or height > PREVIEW_HEIGHT
+
+def encode_proxy(video_path, output_path):
+    result = subprocess.run([
+        'ffmpeg', '-v', 'error', '-y', '-i', video_path,
+        '-map', '0:v:0', '-an', '-sn',
+        # Same stretch to 960x540 as playback.to_preview, one output frame per source frame
+        '-vf', f'scale={PREVIEW_WIDTH}:{PREVIEW_HEIGHT}:flags=area', '-vsync', 'passthrough',
+        '-c:v', 'libx264', '-preset', 'veryfast', '-tune', 'fastdecode', '-crf', '20',
+        '-g', str(PROXY_GOP), '-bf', '0', '-pix_fmt', 'yuv420p',
+        '-f', 'mp4', output_path
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if result.returncode != 0:
+        error = result.stderr.decode("utf-8", errors="replace").strip()
+        raise RuntimeError(f"ffmpeg failed to build a proxy for {video_path}: {error}")
+
+# Returns (proxy path, its VideoIndex), building the proxy if it is not cached
+# yet, or None without ffmpeg. Slow for long sources, so run it off the UI thread.
+def build_proxy(video_path):
+    path = proxy_path_for(video_path)
+    if not os.path.exists(path):
+        if shutil.which('ffmpeg') is None:
+            print("Proxy media needs ffmpeg; previewing the original")
+            return None
+        partial = path + ".part"
+        try:
+            encode_proxy(video_path, partial)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+    return path, load_or_build_index(path)
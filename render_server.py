@@ -0,0 +1,453 @@
+import argparse
+import json
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import error as urlerror, request as urlrequest
+from batch_export import EXIT_EXPORT_FAILED, default_output_path, run_job
+from export_engine import ENCODERS, EXPORT_MODES, init_export_worker, pool_context
+from media_cache import cache_dir
+
+# Local render queue. Accepts export jobs for saved projects over HTTP on
+# localhost, keeps the queue in a JSON file so it survives restarts, and runs
+# jobs in worker processes with a fixed worker count and an optional memory
+# cap per worker.
+#
+#   python render_server.py --workers 2 --memory-mb 4096     # run the queue
+#   python render_server.py submit night/*.json --mode smart  # queue projects
+#   python render_server.py status
+#
+# HTTP API (JSON):
+#   POST   /jobs        {"project": path, "output": path, "mode": "serial", "options": {...}}
+#                       options: encoder, preset, crf, threads, and workers (segmented only)
+#   GET    /jobs        all jobs
+#   GET    /jobs/<id>   one job
+#   DELETE /jobs/<id>   cancel a queued job
+#
+# Jobs that were running when the server stopped are queued again on start.
+# Requests must carry a Host header naming the address the server listens on,
+# and POST bodies must be sent as application/json, so web pages open in a
+# browser on the same machine cannot queue jobs.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_FINISHED = 500  # finished jobs kept in the queue file
+
+FINISHED = ("done", "failed", "cancelled")
+
+# Export options a job may set, and their types. Anything else is rejected
+# up front rather than failing in the worker (and trace_path, which picks
+# where a file is written, is not offered at all).
+JOB_OPTIONS = {"encoder": str, "preset": str, "crf": int, "threads": int, "workers": int}
+
+# None if options are acceptable for mode, otherwise the reason they are not
+def check_options(options, mode):
+    if not isinstance(options, dict):
+        return "options must be an object"
+    for name, value in options.items():
+        expected = JOB_OPTIONS.get(name)
+        if expected is None or (name == "workers" and mode != "segmented"):
+            return f"unknown option for {mode} export: {name}"
+        if type(value) is not expected:
+            return f"option {name} must be a{'n integer' if expected is int else ' string'}"
+    if options.get("encoder", "auto") not in ENCODERS:
+        return f"unknown encoder: {options['encoder']}"
+    return None
+
+def default_queue_path():
+    return os.path.join(cache_dir("render_queue"), "queue.json")
+
+def snapshot_dir():
+    folder = os.path.join(cache_dir("render_queue"), "projects")
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+# Where the GUI snapshots a project before submitting it
+def queued_project_path():
+    return os.path.join(snapshot_dir(), f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.cproj")
+
+# Snapshots belong to their job and go once it is finished; projects
+# submitted from anywhere else are the user's and are left alone
+def remove_snapshot(project):
+    if os.path.dirname(os.path.abspath(project)) != os.path.abspath(snapshot_dir()):
+        return
+    try:
+        os.remove(project)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Could not remove project snapshot: {e}")
+
+class JobQueue:
+    def __init__(self, path):
+        self.path = path
+        self.changed = threading.Condition()
+        self.jobs = []
+        self.next_id = 1
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable queue file: {e}")
+            return
+        self.jobs = data.get("jobs", [])
+        self.next_id = data.get("next_id", len(self.jobs) + 1)
+        for job in self.jobs:
+            if job["status"] == "running":
+                # Interrupted by a restart
+                job["status"] = "queued"
+                job["started"] = None
+
+    def _save_locked(self):
+        finished = [job for job in self.jobs if job["status"] in FINISHED]
+        if len(finished) > MAX_FINISHED:
+            dropped = {job["id"] for job in finished[:len(finished) - MAX_FINISHED]}
+            for job in finished[:len(finished) - MAX_FINISHED]:
+                remove_snapshot(job["project"])
+            self.jobs = [job for job in self.jobs if job["id"] not in dropped]
+
+        partial = self.path + ".part"
+        with open(partial, 'w', encoding="utf-8") as f:
+            json.dump({"next_id": self.next_id, "jobs": self.jobs}, f, indent=4)
+        os.replace(partial, self.path)
+
+    def submit(self, project, output=None, mode="serial", options=None):
+        # Requests are handled on several threads; the id is taken under the lock
+        with self.changed:
+            job = {
+                "id": self.next_id,
+                "project": os.path.abspath(project),
+                "output": os.path.abspath(output or default_output_path(project)),
+                "mode": mode,
+                "options": options or {},
+                "status": "queued",
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+                "result": None,
+            }
+            self.next_id += 1
+            self.jobs.append(job)
+            self._save_locked()
+            self.changed.notify_all()
+        return dict(job)
+
+    def list(self):
+        with self.changed:
+            return [dict(job) for job in self.jobs]
+
+    def get(self, job_id):
+        with self.changed:
+            for job in self.jobs:
+                if job["id"] == job_id:
+                    return dict(job)
+        return None
+
+    def cancel(self, job_id):
+        with self.changed:
+            for job in self.jobs:
+                if job["id"] == job_id and job["status"] == "queued":
+                    job["status"] = "cancelled"
+                    job["finished"] = time.time()
+                    self._save_locked()
+                    remove_snapshot(job["project"])
+                    return True
+        return False
+
+    # Block until a job is queued (or stop is set) and mark it running
+    def take(self, stop):
+        with self.changed:
+            while not stop.is_set():
+                for job in self.jobs:
+                    if job["status"] == "queued":
+                        job["status"] = "running"
+                        job["started"] = time.time()
+                        self._save_locked()
+                        return dict(job)
+                self.changed.wait(0.5)
+        return None
+
+    def finish(self, job_id, result):
+        with self.changed:
+            for job in self.jobs:
+                if job["id"] == job_id:
+                    job["status"] = "done" if result.get("exit_code") == 0 else "failed"
+                    job["finished"] = time.time()
+                    job["result"] = result
+                    self._save_locked()
+                    remove_snapshot(job["project"])
+                    break
+
+def init_render_worker(memory_mb=None):
+    init_export_worker()
+    if memory_mb:
+        try:
+            import resource
+            limit = int(memory_mb) * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"Memory cap not applied: {e}")
+
+# Feeds queued jobs to a process pool, at most `workers` at a time
+class Dispatcher:
+    def __init__(self, queue, workers=1, memory_mb=None):
+        self.queue = queue
+        self.workers = workers
+        self.memory_mb = memory_mb
+        self.slots = threading.Semaphore(workers)
+        self.stop = threading.Event()
+        self.pool = None
+        self.pool_broken = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def shutdown(self):
+        self.stop.set()
+        self.thread.join(timeout=2.0)
+        if self.pool:
+            # Running jobs stay "running" in the queue file and are redone on
+            # the next start. The workers are stopped rather than waited for,
+            # which the interpreter would otherwise do on exit.
+            processes = list((self.pool._processes or {}).values())
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            for process in processes:
+                process.terminate()
+
+    def _new_pool(self):
+        if self.pool:
+            self.pool.shutdown(wait=False)
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=pool_context(),
+                                        initializer=init_render_worker, initargs=(self.memory_mb,))
+        self.pool_broken = False
+
+    def _run(self):
+        self._new_pool()
+        while not self.stop.is_set():
+            if not self.slots.acquire(timeout=0.5):
+                continue
+            job = self.queue.take(self.stop)
+            if job is None:
+                self.slots.release()
+                break
+            if self.pool_broken:
+                self._new_pool()
+
+            print(f"[job {job['id']}] {job['mode']} {job['project']} -> {job['output']}")
+            sys.stdout.flush()
+            future = self.pool.submit(run_job, job["project"], job["output"], job["mode"], job["options"])
+            future.add_done_callback(lambda f, job=job: self._finished(job, f))
+
+    def _finished(self, job, future):
+        try:
+            if future.cancelled():
+                return
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                if self.stop.is_set():
+                    return  # terminated by shutdown(); redone on the next start
+                # A worker died, usually killed for going over the memory cap
+                self.pool_broken = True
+                result = {"exit_code": EXIT_EXPORT_FAILED, "error": "render worker crashed (out of memory?)"}
+            except Exception as e:
+                result = {"exit_code": EXIT_EXPORT_FAILED, "error": str(e)}
+            self.queue.finish(job["id"], result)
+            status = "ok" if result.get("exit_code") == 0 else f"exit {result.get('exit_code')}"
+            print(f"[job {job['id']}] {status} {result.get('error', '')}".rstrip())
+            sys.stdout.flush()
+        finally:
+            self.slots.release()
+
+class JobHandler(BaseHTTPRequestHandler):
+    queue = None
+
+    def _send(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    # A page on another origin that resolves its own name to this address
+    # (DNS rebinding) still sends that name as Host
+    def _host_allowed(self):
+        host, port = self.server.server_address[:2]
+        if host in ("0.0.0.0", "::", ""):
+            return True  # listening on every interface; there is no one name to expect
+        names = {host, "localhost"} if host in ("127.0.0.1", "::1") else {host}
+        allowed = {f"{name}:{port}" for name in names} | {f"[{name}]:{port}" for name in names}
+        if self.headers.get("Host", "") in allowed:
+            return True
+        self._send(403, {"error": "unexpected Host header"})
+        return False
+
+    def _job_id(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            return int(parts[1])
+        return None
+
+    def do_GET(self):
+        if not self._host_allowed():
+            return
+        if self.path.rstrip("/") == "/jobs":
+            self._send(200, {"jobs": self.queue.list()})
+            return
+        job = self.queue.get(self._job_id())
+        if job:
+            self._send(200, job)
+        else:
+            self._send(404, {"error": "no such job"})
+
+    def do_POST(self):
+        if not self._host_allowed():
+            return
+        if self.path.rstrip("/") != "/jobs":
+            self._send(404, {"error": "not found"})
+            return
+        # Browsers send cross-origin text/plain or form posts without asking first
+        if self.headers.get_content_type() != "application/json":
+            self._send(415, {"error": "expected Content-Type: application/json"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            spec = json.loads(self.rfile.read(length) or b"{}")
+            project = spec["project"]
+        except (ValueError, KeyError, TypeError):
+            self._send(400, {"error": "expected JSON with a \"project\" path"})
+            return
+
+        mode = spec.get("mode", "serial")
+        if mode not in EXPORT_MODES:
+            self._send(400, {"error": f"unknown export mode: {mode}"})
+            return
+        options = spec.get("options")
+        if options is None:
+            options = {}
+        problem = check_options(options, mode)
+        if problem:
+            self._send(400, {"error": problem})
+            return
+        if not os.path.isfile(project):
+            self._send(400, {"error": f"project not found: {project}"})
+            return
+        self._send(201, self.queue.submit(project, spec.get("output"), mode, options))
+
+    def do_DELETE(self):
+        if not self._host_allowed():
+            return
+        job_id = self._job_id()
+        if self.queue.cancel(job_id):
+            self._send(200, self.queue.get(job_id))
+        elif self.queue.get(job_id):
+            self._send(409, {"error": "only queued jobs can be cancelled"})
+        else:
+            self._send(404, {"error": "no such job"})
+
+    def log_message(self, format, *args):
+        pass
+
+# Client side, used by the GUI and the submit/status commands
+
+def _call(method, path, body=None, host=DEFAULT_HOST, port=DEFAULT_PORT, timeout=5):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    req = urlrequest.Request(f"http://{host}:{port}{path}", data=data, method=method,
+                             headers={"Content-Type": "application/json"})
+    try:
+        with urlrequest.urlopen(req, timeout=timeout) as response:
+            return json.load(response)
+    except urlerror.HTTPError as e:
+        try:
+            message = json.load(e).get("error", e.reason)
+        except ValueError:
+            message = e.reason
+        raise OSError(f"{e.code}: {message}") from None
+
+def submit_job(project_path, output_path=None, mode="serial", options=None, host=DEFAULT_HOST, port=DEFAULT_PORT):
+    body = {"project": os.path.abspath(project_path), "mode": mode, "options": options or {}}
+    if output_path:
+        body["output"] = os.path.abspath(output_path)
+    return _call("POST", "/jobs", body, host, port)
+
+def list_jobs(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    return _call("GET", "/jobs", host=host, port=port)["jobs"]
+
+def serve(args):
+    queue = JobQueue(args.queue_file or default_queue_path())
+    dispatcher = Dispatcher(queue, max(1, args.workers), args.memory_mb)
+    JobHandler.queue = queue
+    server = ThreadingHTTPServer((args.host, args.port), JobHandler)
+    pending = sum(1 for job in queue.list() if job["status"] == "queued")
+    print(f"Render queue on http://{args.host}:{args.port} ({args.workers} workers, {pending} jobs queued)")
+    sys.stdout.flush()
+
+    def terminate(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, terminate)
+
+    dispatcher.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        dispatcher.shutdown()
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local render queue for caption projects.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"address to listen on / connect to (default: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"port (default: {DEFAULT_PORT})")
+    parser.add_argument("--workers", type=int, default=1, help="jobs rendered at the same time (default: 1)")
+    parser.add_argument("--memory-mb", type=int, help="address-space cap per worker process, in MB (Unix only)")
+    parser.add_argument("--queue-file", help="where the queue is kept (default: in the media cache)")
+    commands = parser.add_subparsers(dest="command")
+
+    submit_parser = commands.add_parser("submit", help="queue saved projects")
+    submit_parser.add_argument("projects", nargs="+", help="project files written by Save Project (.cproj, or legacy .json)")
+    submit_parser.add_argument("-o", "--output-dir", help="directory for rendered videos (default: next to each project)")
+    submit_parser.add_argument("--mode", choices=sorted(EXPORT_MODES), default="serial", help="export mode (default: serial)")
+
+    commands.add_parser("status", help="list the jobs in the queue")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command is None:
+        return serve(args)
+
+    try:
+        if args.command == "submit":
+            if args.output_dir:
+                os.makedirs(args.output_dir, exist_ok=True)
+            for project in args.projects:
+                output = default_output_path(project, args.output_dir)
+                job = submit_job(project, output, args.mode, host=args.host, port=args.port)
+                print(f"queued job {job['id']}: {project} -> {job['output']}")
+        else:
+            for job in list_jobs(args.host, args.port):
+                result = job.get("result") or {}
+                detail = result.get("error") or (f"{result['fps']:.1f} fps" if "fps" in result else "")
+                print(f"{job['id']:>5}  {job['status']:<9}  {job['mode']:<9}  {os.path.basename(job['project'])}  {detail}")
+    except OSError as e:
+        print(f"Render queue error: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+import json
+import math
+import os
+import threading
+import time
+from array import array
+
+# Per-stage timing for the export loop and the preview path. Each stage
+# costs one perf_counter() call and an array append, so it stays on all the
+# time. With trace=True every measurement is also kept as an event and can be
+# written as a Chrome trace (chrome://tracing, Perfetto, speedscope).
+#
+#   t = time.perf_counter()
+#   ret, frame = cap.read()
+#   t = timer.add("decode", t)   # returns the end time, which starts the next stage
+#   out.write(frame)
+#   timer.add("encode", t)
+#
+# summary() sorts every sample for exact percentiles, which is meant for the
+# final report. summary(exact=False) costs the same however long the export
+# has run: it reads running totals and a histogram with HISTOGRAM_STEPS
+# buckets per doubling, so its p95 is an upper bound within about 9%.
+
+HISTOGRAM_STEPS = 8
+MIN_EXPONENT = -30  # durations below 2**-30 s (1 ns) share the first bucket
+HISTOGRAM_SIZE = 40 * HISTOGRAM_STEPS  # up to 2**10 s
+
+def _bucket(seconds):
+    if seconds <= 0:
+        return 0
+    mantissa, exponent = math.frexp(seconds)  # 0.5 <= mantissa < 1
+    bucket = (exponent - MIN_EXPONENT) * HISTOGRAM_STEPS + int((mantissa - 0.5) * 2 * HISTOGRAM_STEPS)
+    return min(max(bucket, 0), HISTOGRAM_SIZE - 1)
+
+def _bucket_top(bucket):
+    exponent, step = divmod(bucket, HISTOGRAM_STEPS)
+    return math.ldexp(0.5 + (step + 1) / (2 * HISTOGRAM_STEPS), exponent + MIN_EXPONENT)
+
+class _Running:
+    __slots__ = ("count", "total", "max", "histogram")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = array('q', bytes(8 * HISTOGRAM_SIZE))
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self.histogram[_bucket(duration)] += 1
+
+    def merge(self, other):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for bucket, n in enumerate(other.histogram):
+            if n:
+                self.histogram[bucket] += n
+
+    def p95(self):
+        target = self.count * 0.95
+        seen = 0
+        for bucket, n in enumerate(self.histogram):
+            seen += n
+            if seen >= target:
+                return min(_bucket_top(bucket), self.max)
+        return self.max
+
+class StageTimer:
+    def __init__(self, trace=False, max_events=1000000):
+        self.samples = {}   # stage -> durations in seconds
+        self.running = {}   # stage -> _Running totals for summary(exact=False)
+        self.trace = trace
+        self.events = []    # (stage, start, duration, pid, thread id) when tracing
+        self.max_events = max_events
+
+    def add(self, stage, start, end=None):
+        if end is None:
+            end = time.perf_counter()
+        samples = self.samples.get(stage)
+        if samples is None:
+            self.running.setdefault(stage, _Running())
+            samples = self.samples.setdefault(stage, array('d'))
+        samples.append(end - start)
+        self.running[stage].add(end - start)
+        if self.trace and len(self.events) < self.max_events:
+            self.events.append((stage, start, end - start, os.getpid(), threading.get_ident()))
+        return end
+
+    # Fold in a timer that ran elsewhere (e.g. returned by a worker process)
+    def merge(self, other):
+        for stage, samples in other.samples.items():
+            self.samples.setdefault(stage, array('d')).extend(samples)
+            self.running.setdefault(stage, _Running()).merge(other.running[stage])
+        if self.trace:
+            self.events.extend(other.events[:max(0, self.max_events - len(self.events))])
+
+    def summary(self, exact=True):
+        if not exact:
+            return self._running_summary()
+        stages = {}
+        for stage, samples in list(self.samples.items()):
+            ordered = sorted(samples)
+            if not ordered:
+                continue
+            total = sum(ordered)
+            stages[stage] = {
+                "count": len(ordered),
+                "total_s": total,
+                "mean_ms": total / len(ordered) * 1000,
+                "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+                "fps": len(ordered) / total if total > 0 else 0.0,
+            }
+        return stages
+
+    def _running_summary(self):
+        stages = {}
+        for stage, running in list(self.running.items()):
+            if not running.count:
+                continue
+            stages[stage] = {
+                "count": running.count,
+                "total_s": running.total,
+                "mean_ms": running.total / running.count * 1000,
+                "p95_ms": running.p95() * 1000,
+                "fps": running.count / running.total if running.total > 0 else 0.0,
+            }
+        return stages
+
+    def write_trace(self, path):
+        events = [
+            {"name": stage, "cat": "export", "ph": "X", "ts": start * 1e6, "dur": duration * 1e6,
+             "pid": pid, "tid": tid}
+            for stage, start, duration, pid, tid in self.events
+        ]
+        with open(path, 'w', encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+def format_summary(stages):
+    return "\n".join(
+        f"{stage}: mean {s['mean_ms']:.2f} ms, p95 {s['p95_ms']:.2f} ms, {s['fps']:.0f} fps"
+        for stage, s in stages.items()
+    )
+
+def trace_path_for(output_path):
+    return os.path.splitext(output_path)[0] + ".trace.json"
@@ -0,0 +1,135 @@
+import re
+from array import array
+import numpy as np
+from caption_core import Caption
+
+# Streaming SRT / WebVTT / ASS import. The parsers read a file line by line
+# and yield (start_ms, end_ms, text) cues; load_subtitles collects the times
+# into flat arrays, converts them to frames with NumPy in one pass and builds
+# the Caption objects in bulk.
+
+SUBTITLE_EXTENSIONS = ('.srt', '.vtt', '.ass', '.ssa')
+
+# 01:02:03,456 (SRT), 01:02:03.456 or 02:03.456 (WebVTT), 1:02:03.45 (ASS)
+TIMESTAMP = r'(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{1,3})'
+CUE_TIMING = re.compile(r'\s*' + TIMESTAMP + r'\s*-->\s*' + TIMESTAMP)
+ASS_TIME = re.compile(TIMESTAMP)
+HTML_TAG = re.compile(r'<[^>]*>')
+ASS_OVERRIDE = re.compile(r'\{[^}]*\}')
+
+def to_ms(hours, minutes, seconds, fraction):
+    # The fraction is in seconds, so ".5" and ".50" are both 500 ms
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction.ljust(3, '0'))
+
+# Captions are single-line in the editor, so subtitle line breaks become spaces
+def clean_text(lines):
+    return " ".join(HTML_TAG.sub('', line) for line in lines).strip()
+
+# SRT and WebVTT share the cue layout: an optional id line, a "start --> end"
+# line (WebVTT may add cue settings after it), then text up to a blank line.
+# Everything outside a cue (headers, NOTE/STYLE blocks, ids) is skipped.
+def parse_srt(lines):
+    timing = None
+    text = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if timing:
+                cue = clean_text(text)
+                if cue:
+                    yield timing[0], timing[1], cue
+            timing = None
+            text = []
+            continue
+
+        match = CUE_TIMING.match(line)
+        if match:
+            groups = match.groups()
+            timing = (to_ms(*groups[:4]), to_ms(*groups[4:]))
+            text = []
+        elif timing:
+            text.append(line)
+
+    if timing:
+        cue = clean_text(text)
+        if cue:
+            yield timing[0], timing[1], cue
+
+parse_vtt = parse_srt
+
+# Dialogue lines from the [Events] section, using its Format line to find the
+# Start, End and Text columns. Override tags are dropped, \N and \n become spaces.
+def parse_ass(lines):
+    in_events = False
+    columns = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            in_events = line.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+
+        key, _, value = line.partition(':')
+        key = key.strip().lower()
+        if key == 'format':
+            columns = [name.strip().lower() for name in value.split(',')]
+        elif key == 'dialogue' and columns and 'text' in columns:
+            fields = value.split(',', len(columns) - 1)
+            if len(fields) < len(columns):
+                continue
+            start = ASS_TIME.fullmatch(fields[columns.index('start')].strip())
+            end = ASS_TIME.fullmatch(fields[columns.index('end')].strip())
+            if not start or not end:
+                continue
+            text = ASS_OVERRIDE.sub('', fields[columns.index('text')])
+            text = text.replace('\\N', ' ').replace('\\n', ' ').replace('\\h', ' ')
+            text = " ".join(text.split())
+            if text:
+                yield to_ms(*start.groups()), to_ms(*end.groups()), text
+
+PARSERS = {
+    '.srt': parse_srt,
+    '.vtt': parse_vtt,
+    '.ass': parse_ass,
+    '.ssa': parse_ass,
+}
+
+# Millisecond times -> inclusive frame ranges. A frame shows a cue if the
+# frame starts inside [start, end), matching how players time subtitles.
+def ms_to_frames(starts_ms, ends_ms, fps):
+    starts = np.frombuffer(starts_ms, dtype=np.int64) if len(starts_ms) else np.zeros(0, dtype=np.int64)
+    ends = np.frombuffer(ends_ms, dtype=np.int64) if len(ends_ms) else np.zeros(0, dtype=np.int64)
+    start_frames = np.ceil(starts * (fps / 1000.0) - 1e-6).astype(np.int64)
+    end_frames = np.ceil(ends * (fps / 1000.0) - 1e-6).astype(np.int64) - 1
+    return start_frames, np.maximum(end_frames, start_frames)
+
+# Read a subtitle file into Caption objects. Cues starting after the last
+# frame are dropped and the rest are clamped to the video.
+def load_subtitles(file_path, fps, total_frames, x=480, y=270, **style):
+    parser = PARSERS.get(('.' + file_path.rsplit('.', 1)[-1]).lower())
+    if parser is None:
+        raise ValueError(f"Unsupported subtitle format: {file_path}")
+    if fps <= 0:
+        raise ValueError("Video frame rate is unknown")
+
+    starts_ms = array('q')
+    ends_ms = array('q')
+    texts = []
+    # utf-8-sig drops the byte order mark many subtitle tools write
+    with open(file_path, "r", encoding="utf-8-sig", errors="replace") as f:
+        for start, end, text in parser(f):
+            starts_ms.append(start)
+            ends_ms.append(end)
+            texts.append(text)
+
+    start_frames, end_frames = ms_to_frames(starts_ms, ends_ms, fps)
+    last_frame = max(total_frames - 1, 0)
+    keep = start_frames <= last_frame
+    start_frames = np.maximum(start_frames, 0)
+    end_frames = np.minimum(end_frames, last_frame)
+
+    return [
+        Caption(texts[i], x, y, start, end, **style)
+        for i, start, end in zip(np.flatnonzero(keep).tolist(), start_frames[keep].tolist(), end_frames[keep].tolist())
+    ]
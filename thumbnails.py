@@ -0,0 +1,71 @@
+import os
+import cv2
+import numpy as np
+from media_cache import cache_path
+from video_index import IndexedSeeker
+
+# Thumbnail filmstrip for the timeline. One thumbnail per equal slice of the
+# video, taken from a keyframe inside the slice when the keyframe index is
+# known, so each one costs a seek and a single decoded frame. Cached on disk
+# keyed by the video's identity, so reopening a video shows the strip at once.
+
+THUMB_WIDTH = 96
+THUMB_HEIGHT = 54
+
+# Frame to show for each of count equal slices: the middle of the slice, or
+# the keyframe before it if that is still inside the slice
+def sample_frames(total_frames, count, index=None):
+    frames = []
+    for i in range(count):
+        start = i * total_frames // count
+        target = min(total_frames - 1, (2 * i + 1) * total_frames // (2 * count))
+        keyframe = index.keyframe_before(target) if index else None
+        frames.append(keyframe if keyframe is not None and keyframe >= start else target)
+    return frames
+
+def thumbnail_cache_path(video_path, count):
+    return cache_path("thumbs", video_path, f"-{count}x{THUMB_WIDTH}x{THUMB_HEIGHT}.npz")
+
+# Calls on_thumb(i, frame_index, rgb_thumbnail) as each thumbnail is ready,
+# from the calling thread. Stops early (without caching) once cancelled() is true.
+def build_thumbnails(video_path, total_frames, count, index=None, on_thumb=None, cancelled=None):
+    path = thumbnail_cache_path(video_path, count)
+    try:
+        with np.load(path) as data:
+            frames, thumbs = data["frames"], data["thumbs"]
+        for i in range(count):
+            if on_thumb:
+                on_thumb(i, int(frames[i]), thumbs[i])
+        return frames, thumbs
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, IndexError) as e:
+        print(f"Ignoring unreadable thumbnail cache: {e}")
+
+    frames = np.array(sample_frames(total_frames, count, index), dtype=np.int64)
+    thumbs = np.zeros((count, THUMB_HEIGHT, THUMB_WIDTH, 3), dtype=np.uint8)
+    cap = cv2.VideoCapture(video_path)
+    seeker = IndexedSeeker(cap, index)
+    try:
+        for i, frame_index in enumerate(frames.tolist()):
+            if cancelled and cancelled():
+                return None
+            seeker.seek(frame_index)
+            ret, frame = seeker.read()
+            if not ret:
+                continue  # left black
+            small = cv2.resize(frame, (THUMB_WIDTH, THUMB_HEIGHT), interpolation=cv2.INTER_AREA)
+            thumbs[i] = cv2.cvtColor(small, cv2.COLOR_BGR2RGB)
+            if on_thumb:
+                on_thumb(i, frame_index, thumbs[i])
+    finally:
+        cap.release()
+
+    partial = path + ".part"
+    try:
+        with open(partial, "wb") as f:
+            np.savez(f, frames=frames, thumbs=thumbs)
+        os.replace(partial, path)
+    except OSError as e:
+        print(f"Could not cache thumbnails: {e}")
+    return frames, thumbs
@@ -0,0 +1,169 @@
+import bisect
+import os
+import subprocess
+import tempfile
+import cv2
+import numpy as np
+from media_cache import cache_path
+
+# Per-video keyframe and timestamp index, built once (ffprobe, or a one-time
+# decode scan when ffprobe is missing) and cached on disk by file identity.
+# Seeks go to the nearest keyframe at or before the target and decode
+# forward, which is frame-accurate and costs at most one GOP.
+
+INDEX_VERSION = 1
+
+class VideoIndex:
+    def __init__(self, pts, keyframes, fps):
+        self.pts = pts                # presentation timestamps (seconds), in frame order
+        self.keyframes = keyframes    # frame numbers of keyframes, ascending
+        self.fps = fps
+
+    @property
+    def frame_count(self):
+        return len(self.pts)
+
+    def keyframe_before(self, frame_index):
+        if not self.keyframes:
+            return None
+        i = bisect.bisect_right(self.keyframes, frame_index) - 1
+        return self.keyframes[max(i, 0)]
+
+    def keyframe_after(self, frame_index):
+        i = bisect.bisect_left(self.keyframes, frame_index)
+        return self.keyframes[i] if i < len(self.keyframes) else None
+
+    def time_of(self, frame_index):
+        if 0 <= frame_index < len(self.pts):
+            return self.pts[frame_index]
+        return frame_index / self.fps if self.fps else 0.0
+
+    # The GUI and an export can build the same index at once, so each writes
+    # its own temporary file and swaps it in; readers never see a partial one
+    def save(self, path):
+        fd, partial = tempfile.mkstemp(suffix=".part", dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, version=INDEX_VERSION, pts=np.asarray(self.pts, dtype=np.float64),
+                         keyframes=np.asarray(self.keyframes, dtype=np.int64), fps=self.fps)
+            os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.remove(partial)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError("stale index version")
+            return cls(data["pts"].tolist(), data["keyframes"].tolist(), float(data["fps"]))
+
+def probe_index(video_path):
+    # Packet-level probe: no decoding, just timestamps and keyframe flags
+    output = subprocess.run([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,dts_time,flags', '-of', 'csv=p=0', video_path
+    ], check=True, capture_output=True, text=True).stdout
+
+    packets = []
+    for line in output.splitlines():
+        fields = line.strip().split(',')
+        if len(fields) < 3:
+            continue
+        pts_time, dts_time, flags = fields[:3]
+        timestamp = pts_time if pts_time not in ('', 'N/A') else dts_time
+        try:
+            packets.append((float(timestamp), 'K' in flags))
+        except ValueError:
+            continue
+
+    # Packets come in decode order; frames are numbered in presentation order
+    packets.sort(key=lambda packet: packet[0])
+    pts = [packet[0] for packet in packets]
+    keyframes = [i for i, packet in enumerate(packets) if packet[1]]
+    return pts, keyframes
+
+def scan_index(video_path):
+    # Fallback: step through every frame once. OpenCV does not expose keyframe
+    # flags, so seeks fall back to plain frame seeks for this video.
+    cap = cv2.VideoCapture(video_path)
+    pts = []
+    try:
+        while cap.grab():
+            pts.append(cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+    finally:
+        cap.release()
+    return pts, []
+
+def build_index(video_path):
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+
+    try:
+        pts, keyframes = probe_index(video_path)
+    except (OSError, subprocess.CalledProcessError):
+        pts, keyframes = scan_index(video_path)
+    if pts:
+        first = pts[0]
+        pts = [t - first for t in pts]
+    return VideoIndex(pts, keyframes, fps)
+
+def load_or_build_index(video_path):
+    path = cache_path("index", video_path, ".npz")
+    if os.path.exists(path):
+        try:
+            return VideoIndex.load(path)
+        except Exception as e:
+            print(f"Ignoring unreadable video index: {e}")
+
+    index = build_index(video_path)
+    try:
+        index.save(path)
+    except OSError as e:
+        print(f"Could not cache video index: {e}")
+    return index
+
+# Seeks a VideoCapture through a VideoIndex. It remembers where the capture is,
+# so a target later in the same GOP is reached by decoding forward instead of seeking.
+class IndexedSeeker:
+    def __init__(self, cap, index=None):
+        self.cap = cap
+        self.index = index
+        self.position = None  # frame the next read() returns, if known
+
+    def seek(self, frame_index):
+        keyframe = self.index.keyframe_before(frame_index) if self.index else None
+        if keyframe is None:
+            if self.position != frame_index:
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+            self.position = frame_index
+            return
+
+        if self.position is not None and keyframe <= self.position <= frame_index:
+            start = self.position
+        else:
+            start = keyframe
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+
+        for _ in range(frame_index - start):
+            if not self.cap.grab():
+                break
+        self.position = frame_index
+
+    # image: optional array from an earlier read, decoded into in place
+    def read(self, image=None):
+        ret, frame = self.cap.read(image)
+        if ret and self.position is not None:
+            self.position += 1
+        else:
+            self.position = None
+        return ret, frame
+
+    def grab(self):
+        ret = self.cap.grab()
+        if ret and self.position is not None:
+            self.position += 1
+        else:
+            self.position = None
+        return ret
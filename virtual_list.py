@@ -0,0 +1,121 @@
+import platform
+import tkinter as tk
+import customtkinter as ctk
+
+# A scrolling list that only has widgets for the rows that fit on screen.
+# Rows are built by make_row(parent) when the list is sized, and re-filled by
+# fill_row(row, index, item) as it scrolls, so 10,000 items cost the same as
+# ten. Editing the items and calling refresh() only re-fills the visible rows.
+
+class VirtualList(ctk.CTkFrame):
+    def __init__(self, master, make_row, fill_row, wheel_rows=3, **kwargs):
+        super().__init__(master, **kwargs)
+        self.make_row = make_row
+        self.fill_row = fill_row
+        self.wheel_rows = wheel_rows
+        self.items = []
+        self.first = 0          # index of the item in the top row
+        self.rows = []
+        self.row_height = None  # measured from the first row
+
+        # Keep the requested size fixed, so adding rows cannot grow the list
+        self.pack_propagate(False)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.yview)
+        self.scrollbar.pack(side="right", fill="y")
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.pack(side="left", fill="both", expand=True)
+        self.body.pack_propagate(False)
+        self.body.bind("<Configure>", lambda event: self._fit(event.height))
+        self._bind_wheel(self.body)
+
+    def set_items(self, items):
+        self.items = items
+        self.refresh()
+
+    # Re-fill the visible rows after the items changed
+    def refresh(self):
+        self.first = max(0, min(self.first, len(self.items) - len(self.rows)))
+        self._render()
+
+    def scroll_to(self, first):
+        first = max(0, min(first, len(self.items) - len(self.rows)))
+        if first != self.first:
+            self.first = first
+            self._render()
+
+    def see(self, index):
+        if index < self.first:
+            self.scroll_to(index)
+        elif index >= self.first + len(self.rows):
+            self.scroll_to(index - len(self.rows) + 1)
+
+    # Same protocol as a Tk widget's yview, so the scrollbar can drive it
+    def yview(self, *args):
+        if not args:
+            return
+        if args[0] == "moveto":
+            self.scroll_to(round(float(args[1]) * len(self.items)))
+        elif args[0] == "scroll":
+            step = int(args[1]) * (len(self.rows) if args[2] == "pages" else 1)
+            self.scroll_to(self.first + step)
+
+    def yview_scroll(self, number, what):
+        self.yview("scroll", number, what)
+
+    def _fit(self, height):
+        if self.row_height is None:
+            row = self._add_row()
+            row.update_idletasks()
+            self.row_height = max(1, row.winfo_reqheight() + 4)
+        wanted = max(1, height // self.row_height)
+        while len(self.rows) < wanted:
+            self._add_row()
+        while len(self.rows) > wanted:
+            self.rows.pop().destroy()
+        self.refresh()
+
+    def _add_row(self):
+        row = self.make_row(self.body)
+        row.pack(fill="x", pady=2)
+        row.shown = True
+        self._bind_wheel(row)
+        self.rows.append(row)
+        return row
+
+    def _render(self):
+        for i, row in enumerate(self.rows):
+            index = self.first + i
+            if index < len(self.items):
+                self.fill_row(row, index, self.items[index])
+                if not row.shown:
+                    row.pack(fill="x", pady=2)
+                    row.shown = True
+            elif row.shown:
+                row.pack_forget()
+                row.shown = False
+
+        count = len(self.items)
+        if count:
+            self.scrollbar.set(self.first / count, min(1.0, (self.first + len(self.rows)) / count))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def _bind_wheel(self, widget):
+        # Bind the plain Tk widgets (CTk widgets forward bind() to their own parts)
+        tk.Misc.bind(widget, "<MouseWheel>", self._on_wheel, "+")
+        if platform.system() == "Linux":
+            tk.Misc.bind(widget, "<Button-4>", self._on_wheel, "+")
+            tk.Misc.bind(widget, "<Button-5>", self._on_wheel, "+")
+        for child in widget.winfo_children():
+            self._bind_wheel(child)
+
+    def _on_wheel(self, event):
+        if event.num == 4:
+            notches = -1
+        elif event.num == 5:
+            notches = 1
+        elif abs(event.delta) >= 120:
+            notches = -event.delta // 120  # Windows
+        else:
+            notches = -event.delta         # macOS
+        self.scroll_to(self.first + notches * self.wheel_rows)